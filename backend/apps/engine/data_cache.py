@@ -0,0 +1,149 @@
+import os
+import zlib
+import logging
+from time import time
+import msgpack
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+DATA_CACHE_MAX_BYTES = int(os.getenv("DATA_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DATA_CACHE_TIMEOUT = 3600 * 24 * 7
+
+FRAME_FORMAT = 1
+# zlib's fastest level; market data compresses well even there
+COMPRESS_LEVEL = 1
+
+
+def encode_frame(df: pd.DataFrame) -> bytes:
+    """Columnar, compressed frame: numeric columns as raw buffers, text
+    columns as msgpack lists. The index is not kept."""
+    columns = []
+    for name in df.columns:
+        values = df[name].to_numpy()
+        if values.dtype == object:
+            columns.append({'name': name, 'values': values.tolist()})
+        else:
+            columns.append({'name': name, 'dtype': values.dtype.str, 'data': np.ascontiguousarray(values).tobytes()})
+    packed = msgpack.packb({'format': FRAME_FORMAT, 'columns': columns}, use_bin_type=True)
+    return zlib.compress(packed, COMPRESS_LEVEL)
+
+def decode_frame(blob: bytes):
+    """None for a blob written in another format."""
+    raw = msgpack.unpackb(zlib.decompress(blob), raw=False)
+    if raw.get('format') != FRAME_FORMAT:
+        return None
+    data = {}
+    for column in raw['columns']:
+        if 'values' in column:
+            data[column['name']] = np.array(column['values'], dtype=object)
+        else:
+            data[column['name']] = np.frombuffer(column['data'], dtype=np.dtype(column['dtype']))
+    return pd.DataFrame(data, copy=False)
+
+
+class BudgetedCache:
+    """Entries in Redis under one namespace, capped at `max_bytes` of encoded
+    data. Entry sizes live in a hash and last use in a sorted set, so the
+    least recently used entries are evicted once the namespace is over
+    budget, before Redis starts evicting broker keys. Frames by default;
+    pass `encode`/`decode` to store anything else as bytes."""
+
+    def __init__(self, namespace: str, max_bytes: int, timeout: int, encode=encode_frame, decode=decode_frame):
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.encode = encode
+        self.decode = decode
+
+    def _key(self, name):
+        return cache.make_key(f"{self.namespace}:{name}")
+
+    @property
+    def _sizes(self):
+        return cache.make_key(f"{self.namespace}_sizes")
+
+    @property
+    def _index(self):
+        return cache.make_key(f"{self.namespace}_index")
+
+    def get(self, name):
+        conn = get_redis_connection("default")
+        blob = conn.get(self._key(name))
+        if blob is None:
+            # expired entries leave their accounting behind
+            conn.hdel(self._sizes, name)
+            conn.zrem(self._index, name)
+            return None
+        conn.zadd(self._index, {name: time()})
+        try:
+            return self.decode(blob)
+        except Exception as e:
+            logger.warning(f"Dropping undecodable {self.namespace} entry {name}: {str(e)}")
+            self.delete(name)
+            return None
+
+    def has(self, name) -> bool:
+        return bool(get_redis_connection("default").exists(self._key(name)))
+
+    def set(self, name, value):
+        blob = self.encode(value)
+        if len(blob) > self.max_bytes:
+            logger.warning(f"{name} is {len(blob)} bytes encoded, over the {self.namespace} budget")
+            return
+        conn = get_redis_connection("default")
+        pipe = conn.pipeline()
+        pipe.set(self._key(name), blob, ex=self.timeout)
+        pipe.hset(self._sizes, name, len(blob))
+        pipe.zadd(self._index, {name: time()})
+        pipe.execute()
+        self._evict(conn)
+
+    def delete(self, name):
+        conn = get_redis_connection("default")
+        pipe = conn.pipeline()
+        pipe.delete(self._key(name))
+        pipe.hdel(self._sizes, name)
+        pipe.zrem(self._index, name)
+        pipe.execute()
+
+    def _evict(self, conn):
+        sizes = {name.decode(): int(size) for name, size in conn.hgetall(self._sizes).items()}
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for name in conn.zrange(self._index, 0, -1):
+            name = name.decode()
+            if total <= self.max_bytes:
+                break
+            total -= sizes.get(name, 0)
+            evicted.append(name)
+        if not evicted:
+            return
+        pipe = conn.pipeline()
+        pipe.delete(*[self._key(name) for name in evicted])
+        pipe.hdel(self._sizes, *evicted)
+        pipe.zrem(self._index, *evicted)
+        pipe.execute()
+        logger.info(f"Evicted {len(evicted)} {self.namespace} entries")
+
+    def usage(self) -> dict:
+        conn = get_redis_connection("default")
+        sizes = {name.decode(): int(size) for name, size in conn.hgetall(self._sizes).items()}
+        last_used = {name.decode(): score for name, score in conn.zrange(self._index, 0, -1, withscores=True)}
+        return {
+            'namespace': self.namespace,
+            'bytes': sum(sizes.values()),
+            'max_bytes': self.max_bytes,
+            'entries': [
+                {'name': name, 'bytes': size, 'last_used': last_used.get(name)}
+                for name, size in sorted(sizes.items(), key=lambda item: -item[1])
+            ],
+        }
+
+
+market_data = BudgetedCache("data", DATA_CACHE_MAX_BYTES, DATA_CACHE_TIMEOUT)
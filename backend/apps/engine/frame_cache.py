@@ -0,0 +1,118 @@
+import os
+import json
+import socket
+import logging
+from collections import OrderedDict
+from threading import Lock
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+
+def memory_limit():
+    """This container's cgroup memory limit in bytes, None if unlimited."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # cgroup v1 reports "unlimited" as a number near 2**63
+        if value == "max" or int(value) >= 1 << 60:
+            return None
+        return int(value)
+    return None
+
+def default_budget():
+    """A quarter of this process's share of the container's memory: prefork
+    runs one cache per child process, async mode one in all."""
+    limit = memory_limit()
+    if limit is None:
+        return 64 * 1024 * 1024
+    if os.getenv('EXECUTION_MODE', 'prefork').lower() == 'async':
+        processes = 1
+    else:
+        processes = int(os.getenv('CELERY_WORKER_CONCURRENCY', '1'))
+    return limit // max(processes, 1) // 4
+
+FRAME_CACHE_MAX_BYTES = int(os.getenv("FRAME_CACHE_MAX_BYTES", "0")) or default_budget()
+
+STATS_KEY = "frame_cache_stats"
+
+
+def frame_size(frame) -> int:
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+class FrameCache:
+    """Market-data frames kept in this worker, least recently used first out
+    once their total size passes the byte budget. Entries carry the store
+    version they were read at; a lookup at any other version drops them."""
+
+    def __init__(self, max_bytes: int = FRAME_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._lock = Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, name, version):
+        with self._lock:
+            entry = self._frames.get(name)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    self._drop(name)
+                self.misses += 1
+                return None
+            self._frames.move_to_end(name)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, name, version, frame):
+        size = frame_size(frame)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if name in self._frames:
+                self._drop(name)
+            self._frames[name] = (version, frame, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._frames)))
+                self.evictions += 1
+
+    def _drop(self, name):
+        _, _, size = self._frames.pop(name)
+        self.bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._frames),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def publish(self):
+        """Share this worker's counters through Redis so the stats view,
+        which runs in another process, can report them."""
+        try:
+            conn = get_redis_connection("default")
+            conn.hset(cache.make_key(STATS_KEY), f"{socket.gethostname()}:{os.getpid()}", json.dumps(self.stats()))
+        except Exception as e:
+            logger.warning(f"Failed to publish frame cache stats: {str(e)}")
+
+
+frames = FrameCache()
+
+
+def worker_stats() -> dict:
+    conn = get_redis_connection("default")
+    return {
+        worker.decode(): json.loads(stats)
+        for worker, stats in conn.hgetall(cache.make_key(STATS_KEY)).items()
+    }
@@ -14,12 +14,36 @@ logger = logging.getLogger(__name__)
 TMPFS_ROOT = "/mnt/backdrop-tmpfs"          
 NETWORK_NAME = "backend_backend"            
 IMAGE_NAME = "code-sandbox"
+RESULT_BIND = "/job_out"
+# sandbox-writable result dirs live on their own size-limited tmpfs, e.g.
+#   mount -t tmpfs -o size=256m,mode=0755,nosuid,nodev,noexec tmpfs /mnt/backdrop-results
+# so a job can only fill that, and can't hardlink anything of the host's into it
+RESULT_ROOT = os.getenv("RESULT_TMPFS_ROOT", "/mnt/backdrop-results")
+# largest result or checkpoint file the worker will read back
+MAX_RESULT_BYTES = int(os.getenv("MAX_RESULT_BYTES", str(64 * 1024 * 1024)))
+# warm sandboxes per worker process; in async mode this is also how many
+# backtests one worker runs at once
+POOL_SIZE = int(os.getenv("CONTAINER_POOL_SIZE", "2"))
+
+def result_dir(tmpfs_path: str) -> str:
+    """Writable dir under RESULT_ROOT paired with a container's read-only
+    input dir, mounted at RESULT_BIND, where the sandbox leaves its packed
+    result."""
+    return os.path.join(RESULT_ROOT, os.path.basename(tmpfs_path))
+
+def check_result_root():
+    with open("/proc/mounts") as mounts:
+        for line in mounts:
+            _, mountpoint, fstype, options = line.split()[:4]
+            if mountpoint == RESULT_ROOT and fstype == "tmpfs" and "size=" in options:
+                return
+    raise RuntimeError(f"{RESULT_ROOT} must be a size-limited tmpfs mount")
 
 class ContainerPool:
     _instance = None
     _lock = Lock()
     _active_containers = set()
-    _executor = ThreadPoolExecutor(max_workers=4)
+    _executor = ThreadPoolExecutor(max_workers=max(4, POOL_SIZE))
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
@@ -31,14 +55,15 @@ class ContainerPool:
 
     def _initialize(self):
         # pathlib.Path(TMPFS_ROOT).mkdir(parents=True, exist_ok=True)
+        check_result_root()
         self.client = docker.from_env()
-        self.pool = Queue(maxsize=2)
+        self.pool = Queue(maxsize=POOL_SIZE)
         self.lock = Lock()
         self.temp_dir_dict = {}
         self._init_pool()
 
     def _init_pool(self):
-        for _ in range(2):
+        for _ in range(POOL_SIZE):
             tmpfs_path = self._create_tmpfs()
             container = self._create_container(tmpfs_path)
             self.temp_dir_dict[container.id] = tmpfs_path
@@ -48,6 +73,10 @@ class ContainerPool:
     def _create_tmpfs(self):
         tmpfs_path = tempfile.mkdtemp(prefix="container_", dir=TMPFS_ROOT)
         os.chmod(tmpfs_path, 0o755)
+        os.mkdir(result_dir(tmpfs_path))
+        # sandboxuser has a different uid than the worker: it may create files
+        # here but not list them, and the worker reads them back by name only
+        os.chmod(result_dir(tmpfs_path), 0o1733)
         logger.info("Temporary subdir created at %s", tmpfs_path)
         return tmpfs_path
 
@@ -61,7 +90,8 @@ class ContainerPool:
                 read_only=True,                    
                 tmpfs={'/tmp': 'rw,noexec,nosuid,size=64M'},  
                 volumes={
-                    tmpfs_path: {'bind': '/host_tmpfs', 'mode': 'ro'}  
+                    tmpfs_path: {'bind': '/host_tmpfs', 'mode': 'ro'},
+                    result_dir(tmpfs_path): {'bind': RESULT_BIND, 'mode': 'rw'}
                 }
             )
             return container
@@ -72,8 +102,9 @@ class ContainerPool:
 
     async def acquire_container_async(self):
         def _acquire():
+            # wait outside the lock, release_container needs it to hand one back
+            container = self.pool.get(block=True, timeout=30)
             with self.lock:
-                container = self.pool.get(block=True, timeout=30)
                 self._active_containers.add(container.id)
                 temp_dir = self.temp_dir_dict[container.id]
                 logger.info("Container %s acquired", container.id)
@@ -83,8 +114,8 @@ class ContainerPool:
         return await loop.run_in_executor(self._executor, _acquire)
 
     def acquire_container(self):
+        container = self.pool.get(block=True, timeout=30)
         with self.lock:
-            container = self.pool.get(block=True, timeout=30)
             self._active_containers.add(container.id)
             temp_dir = self.temp_dir_dict[container.id]
             logger.info("Container %s acquired", container.id)
@@ -94,6 +125,7 @@ class ContainerPool:
         try:
             temp_dir = self.temp_dir_dict[container.id]
             self._clear_tmpfs(temp_dir)
+            self._clear_tmpfs(result_dir(temp_dir))
             with self.lock:
                 self._active_containers.discard(container.id)
                 self.pool.put(container)
@@ -171,6 +203,7 @@ class ContainerPool:
     def _cleanup_tmpfs(self, tmpfs_path: str):
         try:
             shutil.rmtree(tmpfs_path, ignore_errors=True)
+            shutil.rmtree(result_dir(tmpfs_path), ignore_errors=True)
             logger.info("Temporary subdir %s removed", tmpfs_path)
         except Exception as e:
             logger.error("Failed to remove tmpfs subdir %s: %s", tmpfs_path, e, exc_info=True)
@@ -0,0 +1,57 @@
+import os
+import logging
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# how many symbols, and ranges per symbol, the warmer keeps hot
+WARM_SET_SIZE = int(os.getenv("WARM_SET_SIZE", "50"))
+WARM_RANGES_PER_SYMBOL = int(os.getenv("WARM_RANGES_PER_SYMBOL", "3"))
+# counts are scaled by this on every warm run, so old demand fades out
+POPULARITY_DECAY = float(os.getenv("POPULARITY_DECAY", "0.5"))
+# tracked symbols beyond this many times the warm set are dropped
+TRACKED_FACTOR = 4
+
+SYMBOLS_KEY = "popular_symbols"
+
+
+def _ranges_key(name):
+    return cache.make_key(f"popular_ranges:{name}")
+
+def record_request(name, range):
+    """Count one backtest reading `range` of source file `name`."""
+    try:
+        conn = get_redis_connection("default")
+        pipe = conn.pipeline()
+        pipe.zincrby(cache.make_key(SYMBOLS_KEY), 1, name)
+        pipe.zincrby(_ranges_key(name), 1, f"{range['from']}|{range['to']}")
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record request for {name}: {str(e)}")
+
+def warm_set(size=WARM_SET_SIZE, ranges_per_symbol=WARM_RANGES_PER_SYMBOL):
+    """Most requested source files, each with its most requested ranges."""
+    conn = get_redis_connection("default")
+    warm = []
+    for name in conn.zrevrange(cache.make_key(SYMBOLS_KEY), 0, size - 1):
+        name = name.decode()
+        ranges = []
+        for member in conn.zrevrange(_ranges_key(name), 0, ranges_per_symbol - 1):
+            date_from, date_to = member.decode().split("|")
+            ranges.append({'from': date_from, 'to': date_to})
+        warm.append((name, ranges))
+    return warm
+
+def decay(size=WARM_SET_SIZE, ranges_per_symbol=WARM_RANGES_PER_SYMBOL):
+    """Fade every count and drop the long tail, keeping the tracking bounded."""
+    conn = get_redis_connection("default")
+    symbols = cache.make_key(SYMBOLS_KEY)
+    conn.zunionstore(symbols, {symbols: POPULARITY_DECAY})
+    for name in conn.zrange(symbols, 0, -(size * TRACKED_FACTOR) - 1):
+        conn.delete(_ranges_key(name.decode()))
+    conn.zremrangebyrank(symbols, 0, -(size * TRACKED_FACTOR) - 1)
+    for name in conn.zrange(symbols, 0, -1):
+        ranges = _ranges_key(name.decode())
+        conn.zunionstore(ranges, {ranges: POPULARITY_DECAY})
+        conn.zremrangebyrank(ranges, 0, -(ranges_per_symbol * TRACKED_FACTOR) - 1)
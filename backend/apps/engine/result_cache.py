@@ -0,0 +1,173 @@
+import ast
+import os
+import json
+import zlib
+import hashlib
+import logging
+import msgpack
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from apps.market_data.models import StockData
+from .data_cache import BudgetedCache, COMPRESS_LEVEL
+from .frame_cache import worker_stats
+
+logger = logging.getLogger(__name__)
+
+# bump whenever the sandbox starts producing different results for the same input
+RESULT_CACHE_VERSION = 1
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_TIMEOUT = 3600 * 24 * 7
+
+# must match CHECKPOINT_FORMAT in docker/sandbox/checkpoint.py
+CHECKPOINT_FORMAT = 2
+CHECKPOINT_MAX_BYTES = int(os.getenv("CHECKPOINT_MAX_BYTES", str(64 * 1024 * 1024)))
+CHECKPOINT_TIMEOUT = 3600 * 24 * 7
+
+HITS_KEY = "result_cache_hits"
+MISSES_KEY = "result_cache_misses"
+
+
+def normalise_code(code):
+    """Comments and formatting don't change a backtest, so key on the AST."""
+    try:
+        return ast.dump(ast.parse(code))
+    except SyntaxError:
+        return code
+
+def code_digest(code, profile=False):
+    # a profile reports line numbers, which the AST dump leaves out
+    source = code if profile else normalise_code(code)
+    return hashlib.sha256(source.encode()).hexdigest()
+
+def dataset_version(name, symbols):
+    """Latest bar date of every dataset the run reads; a refresh changes it."""
+    if symbols:
+        rows = StockData.objects.filter(symbol__in=symbols).values_list('symbol', 'latest_date')
+    else:
+        rows = StockData.objects.filter(source_file=name).values_list('source_file', 'latest_date')
+    return sorted((source, str(latest)) for source, latest in rows)
+
+def result_key(backtest):
+    symbols = backtest.get('symbols')
+    identity = {
+        'version': RESULT_CACHE_VERSION,
+        'code': code_digest(backtest.get('code') or '', profile=bool(backtest.get('profile'))),
+        'name': backtest.get('name'),
+        'symbols': symbols,
+        'range': backtest.get('range'),
+        'params': backtest.get('params'),
+        'sweep': backtest.get('sweep'),
+        'walk_forward': backtest.get('walk_forward'),
+        'profile': bool(backtest.get('profile')),
+        'data': dataset_version(backtest.get('name'), symbols),
+    }
+    digest = hashlib.sha256(json.dumps(identity, sort_keys=True, default=str).encode()).hexdigest()
+    return f"result_{digest}"
+
+def checkpoint_key(backtest):
+    """Key for the engine checkpoint a later run of the same strategy can
+    resume from. Leaves out range['to'] so an extended range finds it; only
+    single-symbol runs that declare params['maxLookback'] checkpoint."""
+    if backtest.get('symbols') or backtest.get('sweep') or backtest.get('walk_forward'):
+        return None
+    if not (backtest.get('params') or {}).get('maxLookback'):
+        return None
+    identity = {
+        'version': RESULT_CACHE_VERSION,
+        'code': code_digest(backtest.get('code') or ''),
+        'name': backtest.get('name'),
+        'from': (backtest.get('range') or {}).get('from'),
+        'params': backtest.get('params'),
+    }
+    digest = hashlib.sha256(json.dumps(identity, sort_keys=True, default=str).encode()).hexdigest()
+    return f"checkpoint_{digest}"
+
+def compress(blob: bytes) -> bytes:
+    return zlib.compress(blob, COMPRESS_LEVEL)
+
+# a checkpoint holds whole equity curves and trade logs, so it can run to megabytes
+checkpoints = BudgetedCache("checkpoints", CHECKPOINT_MAX_BYTES, CHECKPOINT_TIMEOUT, compress, zlib.decompress)
+
+def load_checkpoint(key):
+    # a missing checkpoint only costs the resume
+    try:
+        return checkpoints.get(key)
+    except Exception as e:
+        logger.warning(f"Failed to load checkpoint: {str(e)}")
+        return None
+
+def _is_packed_array(value):
+    return isinstance(value, dict) and isinstance(value.get('dtype'), str) and isinstance(value.get('data'), bytes)
+
+def is_checkpoint(packed: bytes) -> bool:
+    """Whether `packed` has the shape of a sandbox Checkpoint. It is handed
+    back to a later sandbox run, so nothing else may be cached under a
+    checkpoint key."""
+    try:
+        raw = msgpack.unpackb(packed, raw=False)
+    except Exception:
+        return False
+    if not isinstance(raw, dict) or raw.get('format') != CHECKPOINT_FORMAT:
+        return False
+    if set(raw) != {'format', 'bars', 'digest', 'signals', 'states'}:
+        return False
+    if not (isinstance(raw['bars'], int) and isinstance(raw['digest'], str) and _is_packed_array(raw['signals'])):
+        return False
+    states = raw['states']
+    return isinstance(states, dict) and all(
+        isinstance(state, dict)
+        and isinstance(state.get('bars'), int)
+        and isinstance(state.get('capital'), (int, float))
+        and isinstance(state.get('max_positions'), int)
+        and isinstance(state.get('settings'), list)
+        and _is_packed_array(state.get('equity'))
+        and all(isinstance(columns, dict) and all(_is_packed_array(values) for values in columns.values())
+                for columns in (state.get('trades'), state.get('open_trades')))
+        for state in states.values()
+    )
+
+def save_checkpoint(key, packed):
+    if not is_checkpoint(packed):
+        raise ValueError("not a checkpoint")
+    checkpoints.set(key, packed)
+
+def cacheable(outcome):
+    result = outcome.get('result') if outcome else None
+    return bool(outcome and outcome.get('exit_code') == 0 and result and not result.get('error'))
+
+def encode_outcome(outcome) -> bytes:
+    return zlib.compress(msgpack.packb(outcome, use_bin_type=True), COMPRESS_LEVEL)
+
+def decode_outcome(blob: bytes):
+    return msgpack.unpackb(zlib.decompress(blob), raw=False)
+
+# a sweep or walk-forward result is far bigger than a single run, so the
+# budget is in bytes rather than entries
+results = BudgetedCache("results", RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TIMEOUT, encode_outcome, decode_outcome)
+
+def get_cached_result(key):
+    conn = get_redis_connection("default")
+    outcome = results.get(key)
+    conn.incr(cache.make_key(MISSES_KEY if outcome is None else HITS_KEY))
+    return outcome
+
+def store_result(key, outcome):
+    results.set(key, outcome)
+
+def cache_stats():
+    conn = get_redis_connection("default")
+    hits = int(conn.get(cache.make_key(HITS_KEY)) or 0)
+    misses = int(conn.get(cache.make_key(MISSES_KEY)) or 0)
+    usage = results.usage()
+    checkpoint_usage = checkpoints.usage()
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        'entries': len(usage['entries']),
+        'bytes': usage['bytes'],
+        'max_bytes': usage['max_bytes'],
+        'checkpoints': {'bytes': checkpoint_usage['bytes'], 'max_bytes': checkpoint_usage['max_bytes']},
+        # in-process market data caches, one entry per worker process
+        'frame_cache': worker_stats(),
+    }
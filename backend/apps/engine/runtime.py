@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock
+import aiohttp
+from django.db import close_old_connections
+from .pool import POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopThread:
+    """One event loop per worker process, alive across tasks, with one HTTP
+    session on it. Tasks hand their coroutines over with run(), so however
+    many task threads a worker has, their fetches, file writes and docker
+    execs all overlap on the same loop.
+
+    Started lazily, so prefork children each get their own after the fork."""
+
+    def __init__(self):
+        self._loop = None
+        self._session = None
+        self._lock = Lock()
+
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                # blocking work (docker exec, ORM, file writes) runs here; size it
+                # for every pooled container being busy at once
+                loop.set_default_executor(ThreadPoolExecutor(max_workers=max(32, POOL_SIZE * 4)))
+                Thread(target=loop.run_forever, name="engine-event-loop", daemon=True).start()
+                self._loop = loop
+                logger.info("Started worker event loop")
+            return self._loop
+
+    def run(self, coro):
+        """Run `coro` on the worker loop and block the calling thread until it's done."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop()).result()
+
+    async def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+
+async def db_call(func, *args):
+    """Run an ORM call on a loop thread. Those threads outlive every task,
+    so Django never gets to close their connections; expired or broken
+    ones are dropped around each call, as it does around a request."""
+    def call():
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return await asyncio.to_thread(call)
+
+
+runtime = EventLoopThread()
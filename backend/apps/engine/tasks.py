@@ -1,15 +1,29 @@
 from celery import shared_task
-from .pool import ContainerPool
+from .pool import ContainerPool, result_dir, MAX_RESULT_BYTES
+from .runtime import runtime, db_call
+from .frame_cache import frames
+from .data_cache import market_data
+from .popularity import record_request, warm_set, decay
+from .result_cache import result_key, get_cached_result, store_result, cacheable, checkpoint_key, load_checkpoint, save_checkpoint
+from apps.market_data.models import StockData
+from apps.market_data.store import store
 import docker
 import os
 import logging
-import pickle
+import json
+import mmap
+import stat
+import msgpack
+import numpy as np
 import pandas as pd
-import base64
 from django.core.cache import cache
-from io import StringIO
+from io import BytesIO
 import asyncio
-import aiohttp
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from time import perf_counter, process_time, monotonic
+from uuid import uuid4
 import aiofiles
 
 logger = logging.getLogger(__name__)
@@ -34,62 +48,235 @@ def _format_dir_listing(path: str) -> str:
         return f"(failed to list {path}: {e})"
 
 
-def serialize_df(df):
-    return base64.b64encode(pickle.dumps(df)).decode('utf-8')
+# how long one worker may hold the right to download a symbol; others wait on it
+FETCH_LEASE_TIMEOUT = 30
+FETCH_POLL_INTERVAL = 0.1
 
-def deserialize_df(data_str):
-    return pickle.loads(base64.b64decode(data_str.encode('utf-8')))
+_inflight = {}
+_inflight_lock = threading.Lock()
 
 async def async_fetch_data(name):
-    cache_key = f"data_{name}"
-    cached_data = cache.get(cache_key)
+    """Single-flight fetch: concurrent callers in this worker share one
+    download per symbol, and workers coordinate through a Redis lease.
+    Callers must not modify the returned frame."""
+    with _inflight_lock:
+        future = _inflight.get(name)
+        leader = future is None
+        if leader:
+            future = _inflight[name] = Future()
+    if not leader:
+        logger.info(f"Waiting on in-flight fetch of {name}")
+        return await asyncio.wrap_future(future)
 
-    if cached_data:
-        logger.info(f"Using cached data for {name}")
-        return deserialize_df(cached_data)
-    
-    logger.info("cache_miss")
-    data_url = os.getenv("DATA_URL") + name
-    
+    try:
+        frame = await fetch_data_leased(name)
+        future.set_result(frame)
+    except Exception as e:
+        future.set_exception(e)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(name, None)
+    return future.result()
+
+async def fetch_data_leased(name):
+    lease_key = f"lease_data_{name}"
+    token = uuid4().hex
+    deadline = monotonic() + FETCH_LEASE_TIMEOUT
+
+    while True:
+        cached_data = await asyncio.to_thread(market_data.get, name)
+        if cached_data is not None:
+            logger.info(f"Using cached data for {name}")
+            return cached_data
 
+        if await asyncio.to_thread(cache.add, lease_key, token, timeout=FETCH_LEASE_TIMEOUT):
+            logger.info("cache_miss")
+            try:
+                return await download_data(name)
+            finally:
+                await asyncio.to_thread(release_lease, lease_key, token)
+
+        if monotonic() > deadline:
+            # the lease holder is stuck; don't wait on it forever
+            logger.warning(f"Fetch lease on {name} timed out, fetching directly")
+            return await download_data(name)
+        await asyncio.sleep(FETCH_POLL_INTERVAL)
+
+def release_lease(lease_key, token):
+    if cache.get(lease_key) == token:
+        cache.delete(lease_key)
+
+async def fetch_source(name, start=None):
+    """Bytes of the source CSV, or of its tail from byte `start` when
+    given. Returns (status, body); a server that ignores the range answers
+    200 with the whole file, and 416 means the file got shorter."""
+    # byte offsets have to be counted on the uncompressed file
+    headers = {'Range': f"bytes={start}-", 'Accept-Encoding': 'identity'} if start is not None else None
+    session = await runtime.session()
+    async with session.get(os.getenv("DATA_URL") + name, headers=headers) as response:
+        if response.status == 416:
+            return response.status, b''
+        response.raise_for_status()
+        return response.status, await response.read()
+
+async def download_data(name):
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(data_url) as response:
-                response.raise_for_status()
-                text = await response.text()
+        _, body = await fetch_source(name)
     except Exception as e:
         logger.error(f"Failed to fetch or cache data: {str(e)}")
         raise
 
-    df = pd.read_csv(StringIO(text))
-    cache.set(cache_key, serialize_df(df), timeout=3600 * 24 * 7)
+    df = await asyncio.to_thread(pd.read_csv, BytesIO(body))
+    try:
+        await asyncio.to_thread(market_data.set, name, df)
+    except Exception as e:
+        logger.warning(f"Failed to cache data for {name}: {str(e)}")
     return df
 
 def filter_df(df,range):
-    df['Date'] = pd.to_datetime(df['Date'])
+    # leaves `df` alone, fetched frames are shared between callers
+    dates = pd.to_datetime(df['Date'])
 
     date_from = pd.to_datetime(range['from'])
     date_to = pd.to_datetime(range['to'])
 
-    filtered_df = df[(df['Date'] >= date_from) & (df['Date'] <= date_to)]
+    mask = (dates >= date_from) & (dates <= date_to)
+    filtered_df = df[mask].copy()
 
-    filtered_df['Date'] =  filtered_df['Date'].dt.strftime('%Y-%m-%d')
+    filtered_df['Date'] =  dates[mask].dt.strftime('%Y-%m-%d')
 
     return filtered_df
 
-async def prepare_files(temp_dir, code, data_frame, config):
+async def load_range(name, range):
+    """Bars of `name` within `range` from the local columnar store, or from
+    this worker's memory when the same range was read at the same store
+    version. A symbol the store hasn't seen yet is fetched from the source
+    once and stored. Callers must not modify the returned frame."""
+    await asyncio.to_thread(record_request, name, range)
+    version = await asyncio.to_thread(store.version, name)
+    if version is not None:
+        key = (name, range['from'], range['to'])
+        df = frames.get(key, version)
+        if df is None:
+            df = await asyncio.to_thread(store.read_range, name, range['from'], range['to'])
+            if df is not None:
+                frames.put(key, version, df)
+        if df is not None:
+            return df
+    logger.info(f"{name} not in market data store, fetching source")
+    frame = await async_fetch_data(name)
+    try:
+        meta = await asyncio.to_thread(store.write, name, frame)
+        await db_call(record_latest_date, name, meta)
+    except Exception as e:
+        # a read-only or full store still leaves the source path
+        logger.warning(f"Failed to store {name}: {str(e)}")
+        return filter_df(frame, range)
+    return await asyncio.to_thread(store.read_range, name, range['from'], range['to'])
+
+def record_latest_date(name, meta):
+    if meta.get('latest_date'):
+        StockData.objects.filter(source_file=name).exclude(latest_date=meta['latest_date']).update(latest_date=meta['latest_date'])
+
+def parse_rows(body, columns):
+    """Rows of a headerless CSV tail."""
+    if not body.strip():
+        return pd.DataFrame(columns=columns)
+    return pd.read_csv(BytesIO(body), header=None, names=columns)
+
+async def refresh_symbol(name):
+    """Bring the stored history of `name` up to date with its source. Daily
+    files only grow at the end, so ask for the bytes past what was stored
+    last time and append the rows they hold; anything that doesn't line up
+    falls back to rewriting from the whole file. Updates StockData.latest_date
+    with the store."""
+    meta = await asyncio.to_thread(store.meta, name)
+    if meta is None:
+        return None
+    previous = meta['latest_date']
+
+    updated = body = None
+    offset = meta.get('source_bytes')
+    if offset:
+        # overlap by one byte, the newline that ended the last stored row
+        status, body = await fetch_source(name, offset - 1)
+        if status == 206 and body[:1] == b'\n':
+            try:
+                rows = await asyncio.to_thread(parse_rows, body[1:], meta['columns'])
+                updated = await asyncio.to_thread(store.append, name, rows, offset - 1 + len(body))
+            except ValueError as e:
+                logger.warning(f"Can't append to {name}, rewriting it: {str(e)}")
+            body = None
+        elif status != 200:
+            body = None
+
+    if updated is None:
+        if body is None:
+            _, body = await fetch_source(name)
+        frame = await asyncio.to_thread(pd.read_csv, BytesIO(body))
+        updated = await asyncio.to_thread(store.write, name, frame, len(body))
+
+    if updated['latest_date'] != previous:
+        # the full frame cached in Redis is stale now
+        await asyncio.to_thread(market_data.delete, name)
+    await db_call(record_latest_date, name, updated)
+    return updated
+
+MAX_PORTFOLIO_SYMBOLS = 100
+
+def resolve_source_files(symbols):
+    sources = dict(StockData.objects.filter(symbol__in=symbols).values_list('symbol', 'source_file'))
+    missing = [symbol for symbol in symbols if symbol not in sources]
+    if missing:
+        raise ValueError(f"Unknown symbols: {', '.join(missing)}")
+    return [sources[symbol] for symbol in symbols]
+
+async def fetch_panel(symbols, range):
+    if len(symbols) > MAX_PORTFOLIO_SYMBOLS:
+        raise ValueError(f"Portfolio backtests are limited to {MAX_PORTFOLIO_SYMBOLS} symbols")
+    source_files = await db_call(resolve_source_files, symbols)
+    frames = await asyncio.gather(*(load_range(name, range) for name in source_files))
+    # outer join on date; a symbol is NaN on bars before it lists or where it has gaps
+    return await asyncio.to_thread(lambda: pd.concat(
+        {symbol: frame.set_index('Date') for symbol, frame in zip(symbols, frames)},
+        axis=1
+    ).sort_index())
+
+def write_columns(path, df):
+    """Write `df` as one .npy file per column plus a columns.json manifest,
+    so the sandbox can memory-map the frame instead of unpickling a copy."""
+    os.makedirs(path, exist_ok=True)
+    manifest = {
+        'index': df.index.name,
+        'columns': [list(name) if isinstance(name, tuple) else name for name in df.columns],
+    }
+    columns = [('index', df.index)] if df.index.name else []
+    columns += [(str(position), df[name]) for position, name in enumerate(df.columns)]
+    for file_name, column in columns:
+        values = column.to_numpy()
+        if values.dtype == object:
+            # fixed-width strings, object arrays can't be mapped
+            values = values.astype(str)
+        np.save(os.path.join(path, f"{file_name}.npy"), values, allow_pickle=False)
+    with open(os.path.join(path, "columns.json"), 'w') as f:
+        json.dump(manifest, f)
+
+async def prepare_files(temp_dir, code, data_frame, config, options=None, checkpoint=None):
     loop = asyncio.get_event_loop()
     code_path = os.path.join(temp_dir, "code.py")
-    data_path = os.path.join(temp_dir, "data.pkl")
+    data_path = os.path.join(temp_dir, "data")
     config_path = os.path.join(temp_dir, "config.txt")
 
     async def write_code(path,content):
         async with aiofiles.open(path,'w') as f:
             await f.write(content)
         
+    async def write_bytes(path, content):
+        async with aiofiles.open(path, 'wb') as f:
+            await f.write(content)
+
     async def write_data(path,data):
-        async with aiofiles.open(path,'wb') as f:
-            await f.write(pickle.dumps(data))
+        await asyncio.to_thread(write_columns, path, data)
         
     async def write_config(path, config):
         async with aiofiles.open(path, 'w') as f:
@@ -97,11 +284,19 @@ async def prepare_files(temp_dir, code, data_frame, config):
                 logger.info(f"config values {key}={value}")
                 await f.write(f"{key}={value}\n")
 
-    await asyncio.gather(
+    writes = [
         write_code(code_path, code),
         write_data(data_path, data_frame),
         write_config(config_path, config)
-    )
+    ]
+    # optional job modes (sweep, symbols, walk_forward, profile) travel as <name>.json
+    for option, value in (options or {}).items():
+        if value is not None:
+            writes.append(write_code(os.path.join(temp_dir, f"{option}.json"), json.dumps(value)))
+    if checkpoint:
+        writes.append(write_bytes(os.path.join(temp_dir, "checkpoint.msgpack"), checkpoint))
+
+    await asyncio.gather(*writes)
     
     await loop.run_in_executor(None, os.sync)
     
@@ -111,6 +306,62 @@ async def prepare_files(temp_dir, code, data_frame, config):
     return code_path, data_path, config_path
 
 
+def open_job_file(path):
+    """Open a file the sandbox left in its result dir. The sandbox controls
+    what sits at `path`, so symlinks, anything but a regular file and files
+    over MAX_RESULT_BYTES are refused with ValueError. None when missing."""
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        # O_NOFOLLOW fails with ELOOP on a symlink
+        raise ValueError(f"Refusing {os.path.basename(path)}: {e.strerror}")
+    info = os.fstat(fd)
+    if not stat.S_ISREG(info.st_mode) or info.st_size > MAX_RESULT_BYTES:
+        os.close(fd)
+        raise ValueError(f"Refusing {os.path.basename(path)}: not a regular file under {MAX_RESULT_BYTES} bytes")
+    return os.fdopen(fd, 'rb')
+
+def read_result(path):
+    """Unpack the sandbox's result file straight from the page cache. None
+    when the job died before writing one, or left something unreadable."""
+    try:
+        f = open_job_file(path)
+    except ValueError as e:
+        logger.warning(str(e))
+        return None
+    if f is None:
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as packed:
+            return msgpack.unpackb(packed, raw=False)
+
+@contextmanager
+def timed(timings, phase):
+    """Book the wall and worker CPU time of a block under `phase`. CPU time
+    is process-wide, so in async mode it includes overlapping jobs."""
+    wall, cpu = perf_counter(), process_time()
+    try:
+        yield
+    finally:
+        timings[phase] = {
+            'wall_ms': (perf_counter() - wall) * 1000,
+            'cpu_ms': (process_time() - cpu) * 1000,
+        }
+
+def store_checkpoint(key, path):
+    try:
+        f = open_job_file(path)
+        if f is None:
+            return
+        with f:
+            save_checkpoint(key, f.read())
+    except Exception as e:
+        logger.warning(f"Failed to store checkpoint: {str(e)}")
+
 @shared_task(bind=True, acks_late=True, queue='execution_queue')
 def execute_code_task(self, backtest):
     pool = None
@@ -127,44 +378,129 @@ def execute_code_task(self, backtest):
     code = backtest.get('code')
     config = backtest.get('params')
     range = backtest.get('range')
+    symbols = backtest.get('symbols')
+    options = {
+        'sweep': backtest.get('sweep'),
+        'symbols': symbols,
+        'walk_forward': backtest.get('walk_forward'),
+        'profile': True if backtest.get('profile') else None,
+    }
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    timings = {}
+    cache_key = None
+    try:
+        with timed(timings, 'cache_lookup'):
+            cache_key = result_key(backtest)
+            cached = get_cached_result(cache_key)
+        if cached is not None:
+            logger.info(f"Result cache hit for {cache_key}")
+            return {**cached, 'timings': {'worker': timings, 'sandbox': None}}
+    except Exception as e:
+        logger.warning(f"Result cache lookup failed: {str(e)}")
+
+    resume_key = checkpoint_key(backtest)
 
     container = None
 
     try:
         async def async_execution():
             nonlocal container
-            container, temp_dir = await pool.acquire_container_async()
-            data_frame = await async_fetch_data(name)
-            df = filter_df(data_frame,range)
-            code_path, data_path, config_path = await prepare_files(temp_dir, code, df, config)
-
-            exec_result = await asyncio.to_thread(
-                container.exec_run,
-                'python /app/execute.py',
-                workdir='/host_tmpfs',
-                demux=True
-            )
-
-            result = exec_result.output[0] if exec_result.output[0] else b''
-            stderr = exec_result.output[1].decode() if exec_result.output[1] else ''
+            with timed(timings, 'acquire'):
+                container, temp_dir = await pool.acquire_container_async()
+            if symbols:
+                with timed(timings, 'fetch'):
+                    df = await fetch_panel(symbols, range)
+            else:
+                with timed(timings, 'fetch'):
+                    df = await load_range(name, range)
+            with timed(timings, 'prepare_files'):
+                checkpoint = await asyncio.to_thread(load_checkpoint, resume_key) if resume_key else None
+                code_path, data_path, config_path = await prepare_files(temp_dir, code, df, config, options, checkpoint)
 
-            logger.info(f"Raw stdout length: {len(result)} bytes")
+            with timed(timings, 'exec'):
+                exec_result = await asyncio.to_thread(
+                    container.exec_run,
+                    'python -I -S /app/submit.py',
+                    workdir='/host_tmpfs',
+                    demux=True
+                )
+
+            stdout = exec_result.output[0].decode() if exec_result.output[0] else ''
+            stderr = exec_result.output[1].decode() if exec_result.output[1] else ''
+            with timed(timings, 'read_result'):
+                result = await asyncio.to_thread(read_result, os.path.join(result_dir(temp_dir), "result.msgpack"))
+                if resume_key and exec_result.exit_code == 0:
+                    await asyncio.to_thread(store_checkpoint, resume_key, os.path.join(result_dir(temp_dir), "checkpoint.msgpack"))
 
             return {
                 'exit_code': exec_result.exit_code,
-                'stdout': result.decode() if result else '',
+                'result': result,
+                'stdout': stdout,
                 'stderr': stderr,
+                'timings': {
+                    'worker': timings,
+                    'sandbox': result.pop('timings', None) if result else None,
+                },
             }
 
-        return loop.run_until_complete(async_execution())
+        outcome = runtime.run(async_execution())
+        if cache_key and cacheable(outcome):
+            try:
+                store_result(cache_key, outcome)
+            except Exception as e:
+                logger.warning(f"Failed to cache result: {str(e)}")
+        return outcome
 
     except docker.errors.APIError as e:
         self.retry(exc=e, countdown=5, max_retries=3)
     finally:
         if container:
             pool.release_container(container)
-        if 'loop' in locals():
-            loop.close() 
\ No newline at end of file
+        frames.publish()
+
+
+async def warm_symbol(name, ranges):
+    # stored symbols are kept current by the refresh task, not re-downloaded here
+    if not await asyncio.to_thread(store.has, name):
+        frame = await async_fetch_data(name)
+        meta = await asyncio.to_thread(store.write, name, frame)
+        await db_call(record_latest_date, name, meta)
+    # touch the ranges people ask for so their pages are resident
+    for range in ranges:
+        await asyncio.to_thread(store.read_range, name, range['from'], range['to'])
+
+@shared_task(queue='maintenance_queue', ignore_result=True)
+def warm_market_data_task():
+    """Pre-load the most requested symbols into the market data store, so
+    their first backtests after a deploy don't pay a cold fetch."""
+    warm = warm_set()
+    for name, ranges in warm:
+        try:
+            runtime.run(warm_symbol(name, ranges))
+        except Exception as e:
+            logger.warning(f"Failed to warm {name}: {str(e)}")
+    decay()
+    logger.info(f"Warmed {len(warm)} symbols")
+
+
+REFRESH_CONCURRENCY = int(os.getenv("REFRESH_CONCURRENCY", "8"))
+
+async def refresh_all(names):
+    semaphore = asyncio.Semaphore(REFRESH_CONCURRENCY)
+
+    async def refresh(name):
+        async with semaphore:
+            try:
+                return await refresh_symbol(name)
+            except Exception as e:
+                logger.warning(f"Failed to refresh {name}: {str(e)}")
+                return None
+
+    return await asyncio.gather(*(refresh(name) for name in names))
+
+@shared_task(queue='maintenance_queue', ignore_result=True, soft_time_limit=3300, time_limit=3600)
+def refresh_market_data_task():
+    """Append the day's new bars to every symbol in the market data store."""
+    names = store.source_files()
+    refreshed = runtime.run(refresh_all(names))
+    logger.info(f"Refreshed {sum(meta is not None for meta in refreshed)} of {len(names)} symbols")
@@ -1,3 +1,16 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from apps.engine.validation import check_code, sandbox_validation
+
+
+class CheckCodeTests(SimpleTestCase):
+    def test_uses_the_sandbox_validator(self):
+        self.assertTrue(sandbox_validation.__file__.endswith("docker/sandbox/validation.py"))
+
+    def test_verdicts(self):
+        self.assertIsNone(check_code("def generate_signals(data):\n    data['signal'] = 0\n"))
+        self.assertIn("Syntax error", check_code("def generate_signals(data)"))
+        self.assertIn("generate_signals", check_code("x = 1"))
+        self.assertIn("'generate_signals' must take", check_code("def generate_signals():\n    pass\n"))
+        self.assertIn("not allowed", check_code("def generate_signals(data):\n    pd.io.common.os.system('id')\n"))
+        self.assertIn("not allowed", check_code("import os\ndef generate_signals(data):\n    pass\n"))
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import CodeExecutionView, HealthCheckView, TaskResultView
+from .views import CodeExecutionView, HealthCheckView, ResultCacheStatsView, DataCacheUsageView, TaskResultView
 
 urlpatterns = [
     path('execute/', CodeExecutionView.as_view(), name='execute-code'),
     path('health/', HealthCheckView.as_view(), name='health-check'),
     path('task/<str:task_id>/', TaskResultView.as_view(), name='task-result'),
+    path('cache/', ResultCacheStatsView.as_view(), name='result-cache-stats'),
+    path('cache/data/', DataCacheUsageView.as_view(), name='data-cache-usage'),
 ] 
\ No newline at end of file
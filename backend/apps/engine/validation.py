@@ -0,0 +1,68 @@
+import ast
+import hashlib
+import importlib.util
+from collections import OrderedDict
+from threading import Lock
+from django.conf import settings
+
+VERDICT_CACHE_SIZE = 1024
+
+_verdicts = OrderedDict()
+_verdicts_lock = Lock()
+
+
+def _load_sandbox_validation():
+    # the sandbox's own checks, not a copy of them; docker/sandbox is no package
+    path = settings.BASE_DIR / "docker" / "sandbox" / "validation.py"
+    spec = importlib.util.spec_from_file_location("sandbox_validation", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+sandbox_validation = _load_sandbox_validation()
+
+
+def _check_entry_point(tree):
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == 'generate_signals':
+            arity = len(node.args.posonlyargs) + len(node.args.args)
+            if arity == 0 and node.args.vararg is None:
+                raise ValueError("'generate_signals' must take the data frame as its first argument")
+            return
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == 'generate_signals' for target in node.targets
+        ):
+            return
+    raise ValueError("No valid 'generate_signals' function defined")
+
+
+def _check(code):
+    try:
+        tree = sandbox_validation.validate_user_code(code)
+    except SyntaxError as e:
+        return f"Syntax error on line {e.lineno}: {e.msg}"
+    except ValueError as e:
+        return str(e)
+    try:
+        _check_entry_point(tree)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def check_code(code):
+    """Run the sandbox's static checks before a job is queued. Returns the
+    error message, or None if the code can be submitted. Verdicts are cached
+    by the code's sha256, so resubmitting the same strategy skips the parse."""
+    digest = hashlib.sha256(code.encode()).digest()
+    with _verdicts_lock:
+        if digest in _verdicts:
+            _verdicts.move_to_end(digest)
+            return _verdicts[digest]
+
+    verdict = _check(code)
+    with _verdicts_lock:
+        _verdicts[digest] = verdict
+        if len(_verdicts) > VERDICT_CACHE_SIZE:
+            _verdicts.popitem(last=False)
+    return verdict
@@ -3,6 +3,9 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from .tasks import execute_code_task
+from .validation import check_code
+from .result_cache import cache_stats
+from .data_cache import market_data
 from celery.result import AsyncResult
 import logging
 from redis.exceptions import ConnectionError
@@ -75,6 +78,29 @@ class HealthCheckView(APIView):
         http_status = status.HTTP_200_OK if all(services.values()) else status.HTTP_503_SERVICE_UNAVAILABLE
         return Response(services, status=http_status)
 
+class ResultCacheStatsView(APIView):
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [HealthCheckRateThrottle]
+
+    def get(self, request):
+        try:
+            return Response(cache_stats())
+        except Exception as e:
+            logger.error(f"Error reading result cache stats: {str(e)}")
+            return Response({'error': 'cache unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+class DataCacheUsageView(APIView):
+    # per-symbol bytes of cached market data, for admins
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            return Response(market_data.usage())
+        except Exception as e:
+            logger.error(f"Error reading data cache usage: {str(e)}")
+            return Response({'error': 'cache unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
 class TaskResultView(APIView):
     authentication_classes = []
     permission_classes = [permissions.AllowAny]
@@ -112,6 +138,15 @@ class CodeExecutionView(APIView):
     throttle_classes = [CodeExecutionRateThrottle]
     
     def post(self, request):
+        backtest = request.data.get('backtest')
+        if not backtest or not backtest.get('code'):
+            return Response({'error': 'missing code'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # reject bad code before it costs a queue slot and a container
+        code_error = check_code(backtest['code'])
+        if code_error:
+            return Response({'error': f"Invalid user code: {code_error}"}, status=status.HTTP_400_BAD_REQUEST)
+
         redis_status, redis_message = ServiceStatus.check_redis()
         celery_status = ServiceStatus.celery_status()
         if not redis_status or not celery_status:
@@ -124,11 +159,7 @@ class CodeExecutionView(APIView):
             logger.error(f"Service unavailable: {error_details}")
             return Response(error_details, status=status.HTTP_503_SERVICE_UNAVAILABLE)
             
-        backtest = request.data.get('backtest')
-        name = backtest.get("name")
         logger.info(f"backtest request recieved {backtest}")
-        if not backtest:
-            return Response({'error': 'missing code'}, status=status.HTTP_400_BAD_REQUEST)
             
         try:
             task = execute_code_task.apply_async(kwargs={"backtest": backtest}, queue='execution_queue')
@@ -0,0 +1,40 @@
+import os
+import logging
+from io import BytesIO
+import requests
+import pandas as pd
+from django.core.management.base import BaseCommand
+from apps.market_data.models import StockData
+from apps.market_data.store import store
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Populate the local market data store from the source files listed in StockData"
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help="only these symbols (default: all)")
+        parser.add_argument('--missing', action='store_true', help="skip symbols already in the store")
+
+    def handle(self, *args, symbols=None, missing=False, **options):
+        rows = StockData.objects.all()
+        if symbols:
+            rows = rows.filter(symbol__in=[symbol.upper() for symbol in symbols])
+        source_files = list(rows.values_list('source_file', flat=True))
+
+        stored = failed = 0
+        with requests.Session() as session:
+            for source_file in source_files:
+                if missing and store.has(source_file):
+                    continue
+                try:
+                    response = session.get(os.getenv("DATA_URL") + source_file, timeout=60)
+                    response.raise_for_status()
+                    meta = store.write(source_file, pd.read_csv(BytesIO(response.content)), len(response.content))
+                    StockData.objects.filter(source_file=source_file).update(latest_date=meta['latest_date'])
+                    stored += 1
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Failed to store {source_file}: {str(e)}")
+        self.stdout.write(f"Stored {stored} of {len(source_files)} source files, {failed} failed")
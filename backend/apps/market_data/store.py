@@ -0,0 +1,267 @@
+import os
+import json
+import uuid
+import shutil
+import tempfile
+import logging
+from time import time
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MARKET_DATA_ROOT = os.getenv("MARKET_DATA_ROOT", "/var/lib/backdrop/market-data")
+# appended segments a symbol may collect before it is rewritten as one
+MAX_SEGMENTS = 32
+VERSIONS_DIR = ".versions"
+# how long a replaced version stays on disk for readers that resolved it just before
+RETIRED_VERSION_GRACE = 600
+
+
+class MarketDataStore:
+    """On-disk per-symbol columnar store.
+
+    Each source file becomes a directory holding a sorted datetime64 `Date`
+    array and one .npy per other column, plus meta.json. Reads memory-map the
+    arrays and binary-search the dates, so a range costs two searchsorted
+    calls and the pages actually touched, with no CSV parsing.
+
+    New bars are appended as small immutable segments in numbered
+    subdirectories, listed in meta.json after the base arrays; every
+    MAX_SEGMENTS appends the symbol is compacted back into one.
+
+    Each symbol's directory is a version under .versions/, and root/<symbol>
+    is a symlink to the current one. A write swaps the link in one rename,
+    and readers resolve it once, so they always see a whole version.
+    """
+
+    def __init__(self, root: str = MARKET_DATA_ROOT):
+        self.root = root
+
+    @staticmethod
+    def _name(source_file: str) -> str:
+        return os.path.splitext(os.path.basename(source_file))[0]
+
+    def _path(self, source_file: str) -> str:
+        return os.path.join(self.root, self._name(source_file))
+
+    def _version(self, source_file: str) -> str:
+        """Directory of the symbol's current version."""
+        return os.path.realpath(self._path(source_file))
+
+    @staticmethod
+    def _read_meta(path: str):
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def meta(self, source_file: str):
+        return self._read_meta(self._version(source_file))
+
+    def version(self, source_file: str):
+        """Changes with every write and append of the symbol, for caches of
+        what read_range returns. None if the symbol is not stored."""
+        path = self._version(source_file)
+        try:
+            info = os.stat(os.path.join(path, "meta.json"))
+        except FileNotFoundError:
+            return None
+        # meta.json is replaced, never rewritten in place
+        return (path, info.st_ino, info.st_mtime_ns)
+
+    def has(self, source_file: str) -> bool:
+        return self.meta(source_file) is not None
+
+    def source_files(self):
+        if not os.path.isdir(self.root):
+            return []
+        return [
+            meta['source_file'] for meta in
+            (self.meta(entry) for entry in os.listdir(self.root) if not entry.startswith("."))
+            if meta is not None
+        ]
+
+    def _write_meta(self, path: str, meta: dict):
+        tmp = os.path.join(path, ".meta.json.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+
+    @staticmethod
+    def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+        df = df.copy()
+        df['Date'] = pd.to_datetime(df['Date'])
+        return df.sort_values('Date', kind='stable').drop_duplicates('Date', keep='last')
+
+    def write(self, source_file: str, df: pd.DataFrame, source_bytes: int = None):
+        """Store a frame as read from the source CSV: dates are parsed once
+        here, rows sorted and duplicate dates dropped (last one wins).
+        `source_bytes` is the size of the CSV it came from, which lets a
+        later refresh ask the source for just what was appended."""
+        df = self._prepare(df)
+
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging_", dir=self.root)
+        try:
+            columns = list(df.columns)
+            self._save_columns(staging, df)
+            dates = df['Date']
+            meta = {
+                'source_file': source_file,
+                'columns': columns,
+                'rows': len(df),
+                'first_date': dates.iloc[0].strftime('%Y-%m-%d') if len(df) else None,
+                'latest_date': dates.iloc[-1].strftime('%Y-%m-%d') if len(df) else None,
+                'source_bytes': source_bytes,
+                'segments': [''],
+            }
+            self._write_meta(staging, meta)
+            self._swap_in(staging, source_file)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        logger.info(f"Stored {meta['rows']} rows of {source_file}")
+        return meta
+
+    def _save_columns(self, path: str, df: pd.DataFrame, dtypes=None):
+        for position, name in enumerate(df.columns):
+            values = df[name].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            if dtypes and dtypes[position].kind not in 'US' and values.dtype != dtypes[position]:
+                # segments must concatenate to the stored dtype; an int column
+                # that picked up NaNs can't, and the caller rewrites instead
+                with np.errstate(invalid='ignore'):
+                    cast = values.astype(dtypes[position])
+                if not np.array_equal(cast, values, equal_nan=True):
+                    raise ValueError(f"column {df.columns[position]} no longer fits {dtypes[position]}")
+                values = cast
+            np.save(os.path.join(path, f"{position}.npy"), values, allow_pickle=False)
+
+    def append(self, source_file: str, df: pd.DataFrame, source_bytes: int = None):
+        """Add the rows of `df` dated after the last stored bar, writing only
+        those rows. Falls back to a full write for a symbol not stored yet."""
+        path = self._version(source_file)
+        meta = self._read_meta(path)
+        if meta is None:
+            return self.write(source_file, df, source_bytes)
+        if list(df.columns) != meta['columns']:
+            raise ValueError(f"{source_file} columns changed: {list(df.columns)}")
+
+        df = self._prepare(df)
+        if meta['latest_date'] is not None:
+            df = df[df['Date'] > pd.to_datetime(meta['latest_date'])]
+        segments = meta.get('segments', [''])
+
+        if len(df) and len(segments) >= MAX_SEGMENTS:
+            stored = self.read_range(source_file, meta['first_date'], meta['latest_date'])
+            return self.write(source_file, pd.concat([stored, df.assign(Date=df['Date'].dt.strftime('%Y-%m-%d'))], ignore_index=True), source_bytes)
+
+        if len(df):
+            dtypes = [
+                np.load(os.path.join(path, f"{position}.npy"), mmap_mode='r', allow_pickle=False).dtype
+                for position in range(len(meta['columns']))
+            ]
+            segment = str(int(segments[-1] or 0) + 1)
+            staging = tempfile.mkdtemp(prefix=".staging_", dir=path)
+            try:
+                self._save_columns(staging, df, dtypes)
+                os.rename(staging, os.path.join(path, segment))
+            except Exception:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            meta['segments'] = segments + [segment]
+            meta['rows'] += len(df)
+            meta['latest_date'] = df['Date'].iloc[-1].strftime('%Y-%m-%d')
+            if meta['first_date'] is None:
+                meta['first_date'] = df['Date'].iloc[0].strftime('%Y-%m-%d')
+        meta['source_bytes'] = source_bytes
+        # readers pick up the new segment once the manifest names it
+        self._write_meta(path, meta)
+        logger.info(f"Appended {len(df)} rows to {source_file}")
+        return meta
+
+    def _swap_in(self, staging: str, source_file: str):
+        name = self._name(source_file)
+        versions = os.path.join(self.root, VERSIONS_DIR)
+        os.makedirs(versions, exist_ok=True)
+        version = f"{name}@{uuid.uuid4().hex}"
+        os.rename(staging, os.path.join(versions, version))
+
+        link = self._path(source_file)
+        staged_link = os.path.join(self.root, f".link_{version}")
+        try:
+            os.symlink(os.path.join(VERSIONS_DIR, version), staged_link)
+            previous = os.path.realpath(link) if os.path.lexists(link) else None
+            if previous and not os.path.islink(link):
+                # stored before versions existed: the one time a reader can
+                # briefly find the symbol missing
+                previous = os.path.join(versions, f"{name}@{uuid.uuid4().hex}")
+                os.rename(link, previous)
+            os.replace(staged_link, link)
+        except Exception:
+            if os.path.lexists(staged_link):
+                os.unlink(staged_link)
+            shutil.rmtree(os.path.join(versions, version), ignore_errors=True)
+            raise
+        if previous:
+            # starts its grace period
+            os.utime(previous)
+        self._collect(source_file)
+
+    def _collect(self, source_file: str):
+        """Delete the symbol's replaced versions once their grace period is
+        over. Maps already open on them stay valid after the delete."""
+        name = self._name(source_file)
+        versions = os.path.join(self.root, VERSIONS_DIR)
+        current = os.path.basename(self._version(source_file))
+        cutoff = time() - RETIRED_VERSION_GRACE
+        for entry in os.listdir(versions):
+            if entry.rpartition("@")[0] != name or entry == current:
+                continue
+            path = os.path.join(versions, entry)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+    def read_range(self, source_file: str, date_from, date_to):
+        """Rows with date_from <= Date <= date_to, shaped like filter_df()
+        output (Date as YYYY-MM-DD strings), or None if the symbol is not
+        stored yet."""
+        path = self._version(source_file)
+        meta = self._read_meta(path)
+        if meta is None:
+            return None
+        date_position = meta['columns'].index('Date')
+        date_from = np.datetime64(pd.to_datetime(date_from))
+        date_to = np.datetime64(pd.to_datetime(date_to))
+
+        parts = [[] for _ in meta['columns']]
+        for segment in meta.get('segments', ['']):
+            def column(position):
+                return np.load(os.path.join(path, segment, f"{position}.npy"), mmap_mode='r', allow_pickle=False)
+
+            dates = column(date_position)
+            lo = np.searchsorted(dates, date_from, side='left')
+            hi = np.searchsorted(dates, date_to, side='right')
+            if hi == lo and parts[0]:
+                continue
+            for position in range(len(meta['columns'])):
+                values = dates if position == date_position else column(position)
+                parts[position].append(values[lo:hi])
+
+        data = {}
+        for position, name in enumerate(meta['columns']):
+            values = parts[position][0] if len(parts[position]) == 1 else np.concatenate(parts[position])
+            if position == date_position:
+                data[name] = np.datetime_as_string(values, unit='D')
+            else:
+                data[name] = np.asarray(values)
+        return pd.DataFrame(data, copy=False)
+
+
+store = MarketDataStore()
@@ -1,3 +1,169 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from unittest import mock
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from apps.market_data import store as store_module
+from apps.market_data.store import MarketDataStore, VERSIONS_DIR
+
+
+def bars(first, n, start=100.0):
+    dates = pd.date_range(first, periods=n, freq='B')
+    close = start + np.arange(n, dtype=float)
+    return pd.DataFrame({
+        'Date': dates.strftime('%Y-%m-%d'),
+        'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close,
+        'Volume': np.arange(n, dtype=np.int64) * 100,
+    })
+
+
+class MarketDataStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.store = MarketDataStore(self.root)
+
+    def versions(self):
+        return sorted(os.listdir(os.path.join(self.root, VERSIONS_DIR)))
+
+    def test_read_range(self):
+        df = bars('2020-01-01', 300)
+        # unsorted, with a duplicated date whose last row wins
+        shuffled = pd.concat([df.iloc[150:], df.iloc[:150], df.iloc[[10]].assign(Close=-1.0)], ignore_index=True)
+        meta = self.store.write('AAA.csv', shuffled, source_bytes=1234)
+        self.assertEqual((meta['rows'], meta['first_date'], meta['latest_date']), (300, '2020-01-01', df['Date'].iloc[-1]))
+        self.assertEqual(self.store.source_files(), ['AAA.csv'])
+
+        expected = df.iloc[5:40].reset_index(drop=True)
+        expected.loc[5, 'Close'] = -1.0
+        got = self.store.read_range('AAA.csv', df['Date'].iloc[5], df['Date'].iloc[39])
+        pd.testing.assert_frame_equal(got, expected)
+        self.assertEqual(len(self.store.read_range('AAA.csv', '1990-01-01', '1990-12-31')), 0)
+        self.assertIsNone(self.store.read_range('BBB.csv', '2020-01-01', '2020-12-31'))
+
+    def test_write_swaps_symlink(self):
+        self.store.write('AAA.csv', bars('2020-01-01', 10))
+        first = self.store.version('AAA.csv')
+        link = os.path.join(self.root, 'AAA')
+        self.assertTrue(os.path.islink(link))
+
+        self.store.write('AAA.csv', bars('2020-01-01', 20))
+        self.assertTrue(os.path.islink(link))
+        self.assertNotEqual(self.store.version('AAA.csv'), first)
+        self.assertEqual(len(self.store.read_range('AAA.csv', '2020-01-01', '2020-12-31')), 20)
+        # the replaced version stays for readers that already resolved it
+        self.assertEqual(len(self.versions()), 2)
+        self.assertTrue(os.path.isdir(first[0]))
+        self.assertFalse([entry for entry in os.listdir(self.root) if entry.startswith(('.staging_', '.link_'))])
+
+    def test_reader_keeps_its_version(self):
+        self.store.write('AAA.csv', bars('2020-01-01', 10))
+        resolved = self.store._version
+
+        def swap_after_resolving(source_file):
+            path = resolved(source_file)
+            self.store._version = resolved
+            self.store.write('AAA.csv', bars('2021-01-01', 5))
+            return path
+
+        self.store._version = swap_after_resolving
+        self.assertEqual(len(self.store.read_range('AAA.csv', '2020-01-01', '2020-12-31')), 10)
+        self.assertEqual(len(self.store.read_range('AAA.csv', '2020-01-01', '2020-12-31')), 0)
+
+    def test_retired_versions_collected_after_grace(self):
+        self.store.write('AAA.csv', bars('2020-01-01', 10))
+        self.store.write('BBB.csv', bars('2020-01-01', 10))
+        self.store.write('AAA.csv', bars('2020-01-01', 11))
+        self.assertEqual(len(self.versions()), 3)
+
+        with mock.patch.object(store_module, 'RETIRED_VERSION_GRACE', -1):
+            self.store.write('AAA.csv', bars('2020-01-01', 12))
+        current = os.path.basename(self.store.version('AAA.csv')[0])
+        self.assertEqual([entry for entry in self.versions() if entry.startswith('AAA@')], [current])
+        self.assertEqual(len(self.store.read_range('BBB.csv', '2020-01-01', '2020-12-31')), 10)
+
+    def test_migrates_unversioned_directory(self):
+        self.store.write('AAA.csv', bars('2020-01-01', 10))
+        # lay the symbol out the way it was stored before versions existed
+        link = os.path.join(self.root, 'AAA')
+        version = os.path.realpath(link)
+        os.unlink(link)
+        os.rename(version, link)
+        self.assertEqual(len(self.store.read_range('AAA.csv', '2020-01-01', '2020-12-31')), 10)
+
+        self.store.write('AAA.csv', bars('2020-01-01', 15))
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual(len(self.store.read_range('AAA.csv', '2020-01-01', '2020-12-31')), 15)
+        self.assertEqual(len(self.versions()), 2)
+
+    def test_failed_write_keeps_current_version(self):
+        self.store.write('AAA.csv', bars('2020-01-01', 10))
+        before = self.store.version('AAA.csv')
+        with mock.patch.object(MarketDataStore, '_write_meta', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.store.write('AAA.csv', bars('2020-01-01', 20))
+        self.assertEqual(self.store.version('AAA.csv'), before)
+        self.assertEqual(len(self.versions()), 1)
+        self.assertFalse([entry for entry in os.listdir(self.root) if entry.startswith('.staging_')])
+
+    def test_append_adds_only_new_rows(self):
+        df = bars('2020-01-01', 30)
+        self.store.write('AAA.csv', df.iloc[:20])
+        version = self.store.version('AAA.csv')
+
+        # the overlap with stored bars is dropped, not rewritten
+        meta = self.store.append('AAA.csv', df.iloc[15:25].assign(Close=-1.0), source_bytes=2000)
+        self.assertEqual((meta['rows'], meta['latest_date'], meta['segments']), (25, df['Date'].iloc[24], ['', '1']))
+        self.assertEqual(meta['source_bytes'], 2000)
+        self.assertNotEqual(self.store.version('AAA.csv'), version)
+        self.assertEqual(self.store.version('AAA.csv')[0], version[0])
+
+        self.store.append('AAA.csv', df.iloc[25:])
+        expected = pd.concat([df.iloc[:20], df.iloc[20:25].assign(Close=-1.0), df.iloc[25:]], ignore_index=True)
+        pd.testing.assert_frame_equal(self.store.read_range('AAA.csv', '2020-01-01', '2020-12-31'), expected)
+        # a range inside one segment, and one spanning all three
+        pd.testing.assert_frame_equal(
+            self.store.read_range('AAA.csv', df['Date'].iloc[21], df['Date'].iloc[23]),
+            expected.iloc[21:24].reset_index(drop=True))
+        pd.testing.assert_frame_equal(
+            self.store.read_range('AAA.csv', df['Date'].iloc[18], df['Date'].iloc[27]),
+            expected.iloc[18:28].reset_index(drop=True))
+
+    def test_append_nothing_new(self):
+        df = bars('2020-01-01', 20)
+        self.store.write('AAA.csv', df)
+        meta = self.store.append('AAA.csv', df.iloc[10:], source_bytes=3000)
+        self.assertEqual((meta['rows'], meta['segments'], meta['source_bytes']), (20, [''], 3000))
+
+    def test_append_unstored_symbol_writes_it(self):
+        meta = self.store.append('AAA.csv', bars('2020-01-01', 5))
+        self.assertEqual((meta['rows'], meta['segments']), (5, ['']))
+        self.assertTrue(os.path.islink(os.path.join(self.root, 'AAA')))
+
+    def test_append_compacts_at_max_segments(self):
+        df = bars('2020-01-01', 40)
+        self.store.write('AAA.csv', df.iloc[:5])
+        with mock.patch.object(store_module, 'MAX_SEGMENTS', 4):
+            for stop in range(6, 9):
+                self.store.append('AAA.csv', df.iloc[:stop])
+            self.assertEqual(self.store.meta('AAA.csv')['segments'], ['', '1', '2', '3'])
+            version = self.store.version('AAA.csv')[0]
+
+            meta = self.store.append('AAA.csv', df.iloc[:12])
+        self.assertEqual((meta['rows'], meta['segments']), (12, ['']))
+        self.assertNotEqual(self.store.version('AAA.csv')[0], version)
+        pd.testing.assert_frame_equal(self.store.read_range('AAA.csv', '2020-01-01', '2020-12-31'), df.iloc[:12])
+
+    def test_append_refuses_changed_shape(self):
+        df = bars('2020-01-01', 20)
+        self.store.write('AAA.csv', df.iloc[:10])
+        with self.assertRaises(ValueError):
+            self.store.append('AAA.csv', df.drop(columns='Volume'))
+        # an integer column that picked up gaps no longer fits
+        with self.assertRaises(ValueError):
+            self.store.append('AAA.csv', df.assign(Volume=df['Volume'].where(df.index % 2 == 0)))
+        self.assertEqual(self.store.meta('AAA.csv')['segments'], [''])
+        self.assertFalse([entry for entry in os.listdir(self.store.version('AAA.csv')[0]) if entry.startswith('.staging_')])
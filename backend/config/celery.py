@@ -2,6 +2,7 @@ import os
 import time
 import logging
 from celery import Celery
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -23,10 +24,40 @@ class CeleryConfig:
     task_max_retries = 3
     worker_send_task_events = True
     task_send_sent_event = True
-    worker_concurrency = int(os.getenv('CELERY_WORKER_CONCURRENCY', '1'))
+    # async mode: one process whose task threads share a persistent event loop,
+    # so concurrency is bounded by the container pool instead of process count
+    if os.getenv('EXECUTION_MODE', 'prefork').lower() == 'async':
+        worker_pool = 'threads'
+        worker_concurrency = int(os.getenv('CONTAINER_POOL_SIZE', '2'))
+    else:
+        worker_concurrency = int(os.getenv('CELERY_WORKER_CONCURRENCY', '1'))
 
     task_routes = {
         'apps.engine.tasks.execute_code_task': {'queue': 'execution_queue'},
+        # store upkeep runs on its own worker, never in a backtest slot
+        'apps.engine.tasks.warm_market_data_task': {'queue': 'maintenance_queue'},
+        'apps.engine.tasks.refresh_market_data_task': {'queue': 'maintenance_queue'},
+    }
+
+    # NSE opens 03:45 UTC; warm the popular symbols before that on trading days
+    beat_schedule = {
+        'warm-market-data': {
+            'task': 'apps.engine.tasks.warm_market_data_task',
+            'schedule': crontab(
+                hour=os.getenv('WARM_HOUR_UTC', '3'),
+                minute=os.getenv('WARM_MINUTE_UTC', '0'),
+                day_of_week='mon-fri',
+            ),
+        },
+        # after the close, once the source has the day's bars
+        'refresh-market-data': {
+            'task': 'apps.engine.tasks.refresh_market_data_task',
+            'schedule': crontab(
+                hour=os.getenv('REFRESH_HOUR_UTC', '14'),
+                minute=os.getenv('REFRESH_MINUTE_UTC', '0'),
+                day_of_week='mon-fri',
+            ),
+        },
     }
 
     imports = (
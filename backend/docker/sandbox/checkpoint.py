@@ -0,0 +1,87 @@
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+import numpy as np
+import msgpack
+
+# last signals kept so a resumed run can check them against its recompute
+SIGNAL_TAIL = 512
+CHECKPOINT_FORMAT = 2
+
+
+def data_digest(dates, close: np.ndarray) -> str:
+    """Fingerprint of the bars a checkpoint was taken over."""
+    digest = hashlib.sha1(np.ascontiguousarray(close, dtype=np.float64).tobytes())
+    digest.update("\n".join(map(str, dates)).encode())
+    return digest.hexdigest()
+
+def normalise_signals(signals: np.ndarray) -> np.ndarray:
+    """Signals the way the engine reads them: 1 buy, -1 sell, anything else 0."""
+    return np.where(signals == 1, 1, np.where(signals == -1, -1, 0)).astype(np.int8)
+
+
+@dataclass
+class EngineState:
+    """One trading method's book on the last bar of a run, before the open
+    trades were marked closed at that bar."""
+    bars: int
+    settings: Tuple
+    capital: float
+    equity: np.ndarray
+    trades: Dict[str, np.ndarray]
+    # open positions: trade index, reference price, quantity, highest close since entry
+    open_trades: Dict[str, np.ndarray]
+    max_positions: int
+
+
+@dataclass
+class Checkpoint:
+    bars: int
+    digest: str
+    signals: np.ndarray
+    states: Dict[str, EngineState] = field(default_factory=dict)
+
+    def pack(self) -> bytes:
+        return msgpack.packb({
+            'format': CHECKPOINT_FORMAT,
+            'bars': self.bars,
+            'digest': self.digest,
+            'signals': _pack_array(self.signals),
+            'states': {name: {
+                'bars': state.bars,
+                'settings': list(state.settings),
+                'capital': state.capital,
+                'equity': _pack_array(state.equity),
+                'trades': {column: _pack_array(values) for column, values in state.trades.items()},
+                'open_trades': {column: _pack_array(values) for column, values in state.open_trades.items()},
+                'max_positions': state.max_positions,
+            } for name, state in self.states.items()},
+        }, use_bin_type=True)
+
+    @classmethod
+    def unpack(cls, packed: bytes):
+        """None for a checkpoint written by another format version."""
+        raw = msgpack.unpackb(packed, raw=False)
+        if raw.get('format') != CHECKPOINT_FORMAT:
+            return None
+        return cls(
+            bars=raw['bars'],
+            digest=raw['digest'],
+            signals=_unpack_array(raw['signals']),
+            states={name: EngineState(
+                bars=state['bars'],
+                settings=tuple(state['settings']),
+                capital=state['capital'],
+                equity=_unpack_array(state['equity']),
+                trades={column: _unpack_array(values) for column, values in state['trades'].items()},
+                open_trades={column: _unpack_array(values) for column, values in state['open_trades'].items()},
+                max_positions=state['max_positions'],
+            ) for name, state in raw['states'].items()},
+        )
+
+
+def _pack_array(values: np.ndarray) -> dict:
+    return {'dtype': values.dtype.str, 'data': np.ascontiguousarray(values).tobytes()}
+
+def _unpack_array(packed: dict) -> np.ndarray:
+    return np.frombuffer(packed['data'], dtype=np.dtype(packed['dtype'])).copy()
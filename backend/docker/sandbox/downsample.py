@@ -0,0 +1,69 @@
+import numpy as np
+
+
+def lttb_indices(values: np.ndarray, points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: positions of `points` samples that keep
+    the visual shape of `values` (x is the bar position)."""
+    n = len(values)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    anchor = 0
+    for bucket in range(points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        next_lo, next_hi = (edges[bucket + 1], edges[bucket + 2]) if bucket + 2 < len(edges) else (n - 1, n)
+        next_x = (next_lo + next_hi - 1) / 2
+        next_y = values[next_lo:next_hi].mean()
+
+        xs = np.arange(lo, hi)
+        area = np.abs((anchor - next_x) * (values[lo:hi] - values[anchor])
+                      - (anchor - xs) * (next_y - values[anchor]))
+        anchor = lo + int(np.argmax(area))
+        selected[bucket + 1] = anchor
+    return selected
+
+
+# extra LTTB passes curve_indices may spend filling its point budget
+MAX_FILL_PASSES = 6
+
+
+def curve_indices(equity: np.ndarray, drawdown: np.ndarray, points: int) -> np.ndarray:
+    """Shared sample positions for the equity and drawdown curves, so the two
+    stay aligned point for point. The deepest drawdown and the peak it fell
+    from are always kept.
+
+    `points` is an upper bound. The two LTTB passes pick many of the same
+    bars, so each pass is grown until the merged set comes within 1% of it,
+    or MAX_FILL_PASSES runs out; results usually land within a few percent.
+    """
+    n = len(equity)
+    if not points or points >= n:
+        return np.arange(n)
+
+    extremes = np.empty(0, dtype=np.int64)
+    if n:
+        trough = int(np.nanargmin(drawdown))
+        extremes = np.array([int(np.argmax(equity[:trough + 1])), trough])
+
+    def merged(per_curve):
+        return np.unique(np.concatenate([lttb_indices(equity, per_curve), lttb_indices(drawdown, per_curve), extremes]))
+
+    per_curve = max(points // 2, 3)
+    best = merged(per_curve)
+    step = points - len(best)
+    for _ in range(MAX_FILL_PASSES):
+        if points - len(best) <= points // 100 or step < 1:
+            break
+        candidate = merged(min(per_curve + step, n))
+        if len(candidate) > points:
+            # overshot: both passes added the same bars less often than assumed
+            step //= 2
+            continue
+        per_curve += step
+        best = candidate
+        step = points - len(best)
+    return best
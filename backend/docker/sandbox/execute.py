@@ -1,15 +1,21 @@
 import os
 import sys
-import pickle
+import math
 import pandas as pd
 import numpy as np
 import logging
-import ast
 import json
+import msgpack
 from datetime import datetime
-from strategy import BaseStrategy, Trade
+from strategy import TRADING_METHODS, BaseStrategy, ExitRules, Trade, TradeLog, engine_settings
+from checkpoint import Checkpoint
+from timings import timer, timed
+from profiler import USER_CODE_FILENAME, profiler
+from portfolio import PortfolioBacktest
+from validation import validate_user_code
 import warnings
 import inspect
+import itertools
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,6 +26,9 @@ logging.basicConfig(
 )
 
 HOST_TMPFS_BIND = os.environ.get("HOST_TMPFS_BIND", "/host_tmpfs")
+# writable per-job mount; results go here rather than through docker exec stdout
+RESULT_PATH = os.environ.get("RESULT_PATH", "/job_out/result.msgpack")
+CHECKPOINT_PATH = os.path.join(os.path.dirname(RESULT_PATH), "checkpoint.msgpack")
 
 logger = logging.getLogger(__name__)
 logger.propagate = False;
@@ -43,24 +52,41 @@ def _format_dir_listing(path: str) -> str:
     except Exception as e:
         return f"(failed to list {path}: {e})"
 
+stderr_messages = []
+
 def warning_handler(message, category, filename, lineno, file=None, line=None):
     stderr_messages.append(f"{category.__name__}: {message}")
 
 warnings.showwarning = warning_handler
 
-class SafeCodeVisitor(ast.NodeVisitor):
-    def visit_Import(self, node):
-        raise ValueError("Import statements are not allowed")
-    def visit_ImportFrom(self, node):
-        raise ValueError("Import statements are not allowed")
-    def visit_Call(self, node):
-        if isinstance(node.func, ast.Name) and node.func.id in {"exec", "eval", "open"}:
-            raise ValueError(f"Call to '{node.func.id}' is not allowed")
-        self.generic_visit(node) 
+def read_columns(path):
+    """Rebuild the frame written by the host from its per-column .npy files.
+    Columns are mapped copy-on-write, so nothing is read until it is touched
+    and a strategy that writes to a column only copies the pages it changes."""
+    with open(os.path.join(path, 'columns.json'), 'r') as manifest_file:
+        manifest = json.load(manifest_file)
+
+    def column(file_name):
+        # plain ndarray view over the mapping, pandas doesn't need the memmap subclass
+        return np.asarray(np.load(os.path.join(path, f"{file_name}.npy"), mmap_mode='c', allow_pickle=False))
+
+    df = pd.DataFrame(
+        {tuple(name) if isinstance(name, list) else name: column(position)
+         for position, name in enumerate(manifest['columns'])},
+        copy=False
+    )
+    if manifest['index']:
+        df.index = pd.Index(column('index'), name=manifest['index'])
+    return df
 
-def validate_user_code(code):
-    tree = ast.parse(code)
-    SafeCodeVisitor().visit(tree)
+def read_config(path):
+    """config.txt as the worker writes it: one key=value per line, every value a float."""
+    config = {}
+    with open(path, 'r') as config_file:
+        for line in config_file:
+            key, value = line.strip().split('=')
+            config[key] = float(value)
+    return config
 
 def load_data():
     try:
@@ -71,8 +97,13 @@ def load_data():
         logger.error("Could not list %s at startup: %s", HOST_TMPFS_BIND, e)
 
     code_path = '/host_tmpfs/code.py'
-    data_path = '/host_tmpfs/data.pkl'
+    data_path = '/host_tmpfs/data'
     config_path = '/host_tmpfs/config.txt'
+    sweep_path = '/host_tmpfs/sweep.json'
+    symbols_path = '/host_tmpfs/symbols.json'
+    walk_forward_path = '/host_tmpfs/walk_forward.json'
+    profile_path = '/host_tmpfs/profile.json'
+    checkpoint_path = '/host_tmpfs/checkpoint.msgpack'
 
     try:
         for path, file_type in [(code_path, "Code"), (data_path, "Data"), (config_path, "Config")]:
@@ -90,71 +121,345 @@ def load_data():
             raise RuntimeError(error_msg) from e
 
         try:
-            with open(data_path, 'rb') as data_file:
-                df = pickle.load(data_file)
-                logger.info(f"Successfully read data from {data_path}")
+            df = read_columns(data_path)
+            logger.info(f"Successfully mapped data from {data_path}")
         except Exception as e:
-            error_msg = f"Failed to read or deserialize data file: {str(e)}"
+            error_msg = f"Failed to read data columns: {str(e)}"
             logger.error(error_msg)
             raise RuntimeError(error_msg) from e
 
         try:
-            config = {}
-            with open(config_path, 'r') as config_file:
-                for line in config_file:
-                    key, value = line.strip().split('=')
-                    config[key] = float(value)
+            config = read_config(config_path)
             logger.info(f"Successfully read config from {config_path}")
         except Exception as e:
             error_msg = f"Failed to read or parse config file: {str(e)}"
             logger.error(error_msg)
             raise RuntimeError(error_msg) from e
 
-        return code, df, config
+        # optional job modes, each shipped as a json file next to the code
+        options = {}
+        for path, option in [(sweep_path, "sweep"), (symbols_path, "symbols"), (walk_forward_path, "walk_forward"), (profile_path, "profile")]:
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r') as option_file:
+                    options[option] = json.load(option_file)
+                logger.info(f"Successfully read {option} from {path}")
+            except Exception as e:
+                error_msg = f"Failed to read or parse {option} file: {str(e)}"
+                logger.error(error_msg)
+                raise RuntimeError(error_msg) from e
+
+        # a bad checkpoint only costs the resume, never the run
+        if os.path.exists(checkpoint_path):
+            try:
+                with open(checkpoint_path, 'rb') as checkpoint_file:
+                    options["checkpoint"] = Checkpoint.unpack(checkpoint_file.read())
+                logger.info(f"Successfully read checkpoint from {checkpoint_path}")
+            except Exception as e:
+                logger.error(f"Ignoring unreadable checkpoint: {str(e)}")
+
+        return code, df, config, options
 
     except Exception as e:
         logger.error(f"Data loading error: {str(e)}")
         sys.exit(2)
 
-class StrategyResultEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.int64): 
-            return int(obj)
-        if isinstance(obj, np.float64):
-            return float(obj)
-        if isinstance(obj, pd.Series):  
-            return obj.tolist()
-        if isinstance(obj, datetime):  
-            return obj.isoformat()
-        if isinstance(obj, Trade):  
-            return obj.__dict__
-        return super().default(obj)
+MAX_SWEEP_CONFIGS = 500
+MAX_WALK_FORWARD_WINDOWS = 100
 
-if __name__ == "__main__":
-    stderr_messages = []  
+SWEEP_METRICS = [
+    "finalCapital", "totalReturn", "totalReturnPct", "sharpeRatio", "maxDrawdown",
+    "maxDrawdownPct", "winRate", "profitFactor", "numTrades", "avgTradePnl",
+    "avgWinnerPnl", "avgLoserPnl", "annualizedVolatility", "calmarRatio", "sortinoRatio",
+]
+
+def expand_grid(spec):
+    """A list is taken as-is; a dict of lists becomes its cartesian product."""
+    if spec is None:
+        return []
+    if isinstance(spec, dict):
+        keys = list(spec)
+        values = [v if isinstance(v, list) else [v] for v in spec.values()]
+        return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+    return list(spec)
+
+def distinct_signal_sets(spec, takes_params):
+    signal_sets = expand_grid(spec)
+    if signal_sets and not takes_params:
+        raise ValueError("generate_signals must accept (data, params) to sweep signal parameters")
+
+    # identical signal parameter sets share a single generate_signals call
+    distinct = {}
+    for signal_params in signal_sets or [{} if takes_params else None]:
+        distinct.setdefault(json.dumps(signal_params, sort_keys=True), signal_params)
+    return list(distinct.values())
+
+def run_sweep(strategy_cls, df, config, sweep, takes_params):
+    """Run every engine config against every distinct signal parameter set.
+
+    `sweep` looks like {"signal_params": [...] | {...}, "engine": [...] | {...}};
+    engine entries override `config` keys (initialCapital, investmentPerTrade,
+    tradingMethod, stopLoss, takeProfit, trailingStop). Returns a
+    {"columns", "rows"} table of metrics.
+    """
+    signal_sets = distinct_signal_sets(sweep.get("signal_params"), takes_params)
+    engine_sets = expand_grid(sweep.get("engine")) or [{}]
+
+    if len(signal_sets) * len(engine_sets) > MAX_SWEEP_CONFIGS:
+        raise ValueError(f"Sweep exceeds {MAX_SWEEP_CONFIGS} configurations")
+
+    param_keys = sorted({key for params in signal_sets if params for key in params})
+    columns = param_keys + ["initialCapital", "investmentPerTrade", "tradingMethod"] + SWEEP_METRICS
+    rows = []
+    for signal_params in signal_sets:
+        strategy = strategy_cls(df.copy(deep=False), params=signal_params)
+        strategy.compute_signals()
+        for engine in engine_sets:
+            engine = {**config, **engine}
+            strategy.reset(
+                engine['initialCapital'],
+                engine['investmentPerTrade'],
+                int(engine.get('tradingMethod', 0)),
+                ExitRules.from_config(engine)
+            )
+            result = strategy.execute(curves=False).__dict__
+            rows.append(
+                [(signal_params or {}).get(key) for key in param_keys]
+                + [strategy.initialCapital, strategy.investment_per_trade, strategy.trading_method]
+                + [result[key] for key in SWEEP_METRICS]
+            )
+    return {"columns": columns, "rows": rows}
+
+def objective_value(value):
+    if value == "∞":
+        return float("inf")
+    if isinstance(value, str) or value is None or np.isnan(value):
+        return float("-inf")
+    return value
+
+def run_walk_forward(strategy_cls, df, config, spec, takes_params):
+    """Pick the best signal parameters on each rolling in-sample window and
+    score them on the out-of-sample window that follows.
+
+    `spec` looks like {"train_bars", "test_bars", "step_bars", "signal_params",
+    "objective"}. Signals are generated once per parameter set over the whole
+    range and every window runs on slices of those arrays.
+    """
+    train = int(spec["train_bars"])
+    test = int(spec["test_bars"])
+    step = int(spec.get("step_bars", test))
+    objective = spec.get("objective", "sharpeRatio")
+    if objective not in SWEEP_METRICS:
+        raise ValueError(f"Unknown walk-forward objective: {objective}")
+    if train < 2 or test < 2 or step < 1:
+        raise ValueError("Walk-forward windows need at least 2 bars and a positive step")
+
+    windows = [
+        (start, start + train, start + train + test)
+        for start in range(0, len(df) - train - test + 1, step)
+    ]
+    if not windows:
+        raise ValueError("Date range is too short for a single walk-forward window")
+    if len(windows) > MAX_WALK_FORWARD_WINDOWS:
+        raise ValueError(f"Walk-forward exceeds {MAX_WALK_FORWARD_WINDOWS} windows")
+
+    signal_sets = distinct_signal_sets(spec.get("signal_params"), takes_params)
+    if len(signal_sets) > MAX_SWEEP_CONFIGS:
+        raise ValueError(f"Walk-forward exceeds {MAX_SWEEP_CONFIGS} parameter sets")
+
+    # the frame is only needed while generate_signals runs; keep just the signal arrays
+    signals = []
+    for signal_params in signal_sets:
+        strategy = strategy_cls(df.copy(deep=False), params=signal_params)
+        signals.append(strategy.compute_signals())
+
+    def run(candidate, start, stop):
+        strategy.reset(config['initialCapital'], config['investmentPerTrade'], 0, ExitRules.from_config(config))
+        return strategy.execute(start, stop, curves=False, signals=signals[candidate]).__dict__
+
+    dates = strategy.data.index
+    param_keys = sorted({key for params in signal_sets if params for key in params})
+    columns = (["trainFrom", "trainTo", "testFrom", "testTo"] + param_keys
+               + [f"inSample_{objective}"] + SWEEP_METRICS)
+    rows = []
+    for start, split, stop in windows:
+        scores = [objective_value(run(candidate, start, split)[objective]) for candidate in range(len(signal_sets))]
+        best = int(np.argmax(scores))
+        result = run(best, split, stop)
+        rows.append(
+            [dates[start], dates[split - 1], dates[split], dates[stop - 1]]
+            + [(signal_sets[best] or {}).get(key) for key in param_keys]
+            + [scores[best]]
+            + [result[key] for key in SWEEP_METRICS]
+        )
+    return {"columns": columns, "rows": rows}
+
+def run_trading_methods(strategy, config):
+    """Generate signals once and replay them through every trading method."""
+    strategy.compute_signals()
+    results = {}
+    for name, trading_method in TRADING_METHODS.items():
+        logger.info(f"Running {name} backtest")
+        strategy.reset(
+            config['initialCapital'],
+            config['investmentPerTrade'],
+            trading_method,
+            ExitRules.from_config(config)
+        )
+        results[name] = strategy.execute().__dict__
+    return results
+
+def declared_lookback(config):
+    """config['maxLookback']: the most bars of history any signal of the
+    strategy depends on, e.g. its longest rolling window. None if unset or
+    not a positive whole number; config.txt hands every value over as a float."""
+    lookback = config.get('maxLookback')
+    if isinstance(lookback, bool) or not isinstance(lookback, (int, float)):
+        return None
+    if not float(lookback).is_integer() or lookback < 1:
+        return None
+    return int(lookback)
+
+def run_resumable(strategy, config, checkpoint=None):
+    """run_trading_methods for a single symbol, picking up from `checkpoint`
+    when it covers a prefix of the data under the same settings. Only
+    strategies that declare their lookback resume or checkpoint at all.
+
+    Returns (results, resumed, checkpoint for the next run or None).
+    """
+    lookback = declared_lookback(config)
+    if lookback is None:
+        return run_trading_methods(strategy, config), False, None
+
+    exit_rules = ExitRules.from_config(config)
+    settings = {
+        name: engine_settings(config['initialCapital'], config['investmentPerTrade'], trading_method, exit_rules)
+        for name, trading_method in TRADING_METHODS.items()
+    }
+    resumed = (
+        checkpoint is not None
+        and all(name in checkpoint.states and checkpoint.states[name].settings == expected
+                for name, expected in settings.items())
+        and strategy.resume_signals(checkpoint, lookback)
+    )
+    if not resumed:
+        strategy.compute_signals()
+
+    next_checkpoint = strategy.checkpoint()
+    results = {}
+    for name, trading_method in TRADING_METHODS.items():
+        logger.info(f"Running {name} backtest" + (f" from bar {checkpoint.bars}" if resumed else ""))
+        strategy.reset(
+            config['initialCapital'],
+            config['investmentPerTrade'],
+            trading_method,
+            ExitRules.from_config(config)
+        )
+        results[name] = strategy.execute(resume_from=checkpoint.states[name] if resumed else None).__dict__
+        next_checkpoint.states[name] = strategy.engine_state()
+    return results, resumed, next_checkpoint
+
+@timed('checkpoint')
+def write_checkpoint(checkpoint):
+    try:
+        partial = CHECKPOINT_PATH + '.tmp'
+        with open(partial, 'wb') as checkpoint_file:
+            checkpoint_file.write(checkpoint.pack())
+        os.replace(partial, CHECKPOINT_PATH)
+    except Exception as e:
+        logger.error(f"Failed to write checkpoint: {str(e)}")
+
+def encode_result(obj):
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, (pd.Series, np.ndarray)):
+        return obj.tolist()
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, TradeLog):
+        return obj.to_columns()
+    if isinstance(obj, Trade):
+        return obj.__dict__
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+def json_safe(value):
+    """`value` with every inf and NaN as None. msgpack carries them fine, but
+    the API answers in strict JSON, where they are not allowed."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if isinstance(value, (np.ndarray, pd.Series)):
+        return json_safe(value.tolist())
+    if isinstance(value, np.floating):
+        return json_safe(float(value))
+    if isinstance(value, TradeLog):
+        return json_safe(value.to_columns())
+    if isinstance(value, Trade):
+        return json_safe(value.__dict__)
+    return value
+
+def write_result(output):
+    """Pack the job output to RESULT_PATH. Written under a temp name and
+    renamed, so the worker never picks up a half-written file.
+
+    A running profiler is stopped and its hot lines added. The map is
+    streamed entry by entry so the phase timings, packed last, include the
+    time spent encoding everything before them."""
+    profile = profiler.stop()
+    if profile:
+        output = {**output, "profile": profile}
+    partial = RESULT_PATH + '.tmp'
+    packer = msgpack.Packer(default=encode_result, use_bin_type=True)
+    with open(partial, 'wb') as result_file:
+        with timer.phase('encode'):
+            result_file.write(packer.pack_map_header(len(output) + 1))
+            for key, value in output.items():
+                result_file.write(packer.pack(key))
+                result_file.write(packer.pack(json_safe(value)))
+        result_file.write(packer.pack('timings'))
+        result_file.write(packer.pack(timer.report()))
+    os.replace(partial, RESULT_PATH)
+
+def main():
+    timer.reset()
     try:
         logger.info("Starting execution of backtest code")
-        code, df, config = load_data()
+        with timer.phase('load'):
+            code, df, config, options = load_data()
 
-        try:
-            validate_user_code(code)
-        except ValueError as e:
-            print(f"Invalid user code: {e}")
-            raise
+        with timer.phase('compile'):
+            try:
+                validate_user_code(code)
+            except ValueError as e:
+                print(f"Invalid user code: {e}")
+                raise
         
-        local_env = {
-            "pd": pd, 
-            "np": np  
-        }   
+            local_env = {
+                "pd": pd, 
+                "np": np  
+            }   
+
+            logger.info("Executing user-provided code")
+            # compiled under its own name so tracebacks and the profiler can point at user lines
+            exec(compile(code, USER_CODE_FILENAME, 'exec'), None, local_env)
 
-        logger.info("Executing user-provided code")
-        exec(code,None, local_env)
+        if options.get("profile"):
+            profiler.start(code)
         
         if 'generate_signals' not in local_env or not callable(local_env['generate_signals']):
             raise ValueError("No valid 'generate_signals' function defined")
         
         user_fn = local_env['generate_signals']
         sig = inspect.signature(user_fn)    
+        takes_params = len(sig.parameters) >= 2
         
         if len(sig.parameters) == 1:
             logger.error("User function takes data")
@@ -171,22 +476,59 @@ if __name__ == "__main__":
             {"generate_signals": local_env['generate_signals']}
         )
 
+        if "symbols" in options:
+            if "sweep" in options or "walk_forward" in options:
+                raise ValueError("Sweeps and walk-forward runs are not supported for portfolio backtests")
+            logger.info(f"Running portfolio backtest over {len(options['symbols'])} symbols")
+            portfolio = PortfolioBacktest(
+                df,
+                UserStrategy,
+                initial_capital=config['initialCapital'],
+                investment_per_trade=config['investmentPerTrade'],
+                params={} if takes_params else None,
+                curve_points=int(config.get('curvePoints', 0)) or None
+            )
+            output = {
+                "results": {
+                    "portfolio": run_trading_methods(portfolio, config),
+                },
+                "warnings": stderr_messages if stderr_messages else None
+            }
+            write_result(output)
+            sys.exit(0)
+
+        if "walk_forward" in options:
+            logger.info("Running walk-forward optimisation")
+            output = {
+                "results": {
+                    "walk_forward": run_walk_forward(UserStrategy, df, config, options["walk_forward"], takes_params),
+                },
+                "warnings": stderr_messages if stderr_messages else None
+            }
+            write_result(output)
+            sys.exit(0)
+
+        if "sweep" in options:
+            logger.info("Running parameter sweep")
+            output = {
+                "results": {
+                    "sweep": run_sweep(UserStrategy, df, config, options["sweep"], takes_params),
+                },
+                "warnings": stderr_messages if stderr_messages else None
+            }
+            write_result(output)
+            sys.exit(0)
+
         logger.info("Initializing user strategy with provided data")
         try: 
-            loss_cutting_strategy = UserStrategy(
-                df.copy(),
+            strategy = UserStrategy(
+                df,
                 initial_capital=config['initialCapital'],
                 investment_per_trade=config['investmentPerTrade'],
-                trading_method=0
+                params={} if takes_params else None,
+                curve_points=int(config.get('curvePoints', 0)) or None
             )
-            # risk_reduction_strategy = UserStrategy(
-            #     df.copy(),
-            #     trading_method=1
-            # )
-            logger.info(f"Has run_backtest? {'run_backtest' in dir(loss_cutting_strategy)}")
-            
-            
-            # logger.info(f"Has run_backtest? {'run_backtest' in dir(risk_reduction_strategy)}")
+            logger.info(f"Has run_backtest? {'run_backtest' in dir(strategy)}")
 
         except Exception as e:
             logger.error(f"Failed to initialize strategy: {str(e)}")
@@ -194,37 +536,26 @@ if __name__ == "__main__":
 
         logger.info("Running backtest")
         try:
-            logger.info("About to run backtest for loss cutting strategy")
-            loss_cutting_results = loss_cutting_strategy.run_backtest()
-            logger.info("Loss cutting backtest completed")
-            
-            logger.info("About to run backtest for risk reduction strategy")
-            # risk_reduction_results = risk_reduction_strategy.run_backtest()
-            logger.info("Risk reduction backtest completed")
-            
+            results, resumed, checkpoint = run_resumable(strategy, config, options.get("checkpoint"))
             logger.info("Backtest completed successfully")
-            
-            
+
             output = {
-                "results": {
-                    "loss_cutting": loss_cutting_results.__dict__,
-                },
+                "results": results,
+                "resumed": resumed,
                 "warnings": stderr_messages if stderr_messages else None
             }
-            # "risk_reduction": risk_reduction_results.__dict__
-            result_json = json.dumps(output, cls=StrategyResultEncoder, indent=4)
-            sys.stdout.write(result_json)
-            sys.stdout.flush()
+            if checkpoint is not None:
+                write_checkpoint(checkpoint)
+            write_result(output)
 
         except AttributeError as e:
             logger.error(f"Strategy does not have a 'run_backtest' method. Error: {str(e)}")
-            logger.error(f"Available methods: {dir(loss_cutting_strategy)}")
+            logger.error(f"Available methods: {dir(strategy)}")
             error_output = {
                 "error": str(e),
                 "warnings": stderr_messages if stderr_messages else None
             }
-            sys.stdout.write(json.dumps(error_output))
-            sys.stdout.flush()
+            write_result(error_output)
             sys.exit(69)
 
     except Exception as e:
@@ -233,6 +564,9 @@ if __name__ == "__main__":
              "error": str(e),
             "warnings": stderr_messages if stderr_messages else None
         }
-        sys.stdout.write(json.dumps(error_output))
-        sys.stdout.flush()
+        write_result(error_output)
         sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import heapq
+import numpy as np
+import pandas as pd
+from strategy import ExitRules, OpenPositionLedger, StrategyResult, TradeLog, curve_records
+from metrics import compute_metrics
+from timings import timer, timed
+
+
+class PortfolioBacktest:
+    """Backtest a date x symbol panel against one shared pool of capital.
+
+    `panel` has a 'Date' index and (symbol, field) columns. Signals come from
+    the single-symbol strategy class, run once per symbol on that symbol's own
+    rows; fills and marking then happen across the whole panel at once.
+    """
+
+    def __init__(self, panel: pd.DataFrame, strategy_cls, initial_capital: float = 100000, investment_per_trade: float = 10000, trading_method: int = 0, params: dict = None, exit_rules: ExitRules = None, curve_points: int = None):
+        self.panel = panel.sort_index()
+        self.panel.columns = pd.MultiIndex.from_tuples(
+            [(symbol, field.lower()) for symbol, field in self.panel.columns]
+        )
+        self.panel.index.name = 'Date'
+        self.symbols = list(dict.fromkeys(self.panel.columns.get_level_values(0)))
+        self.strategy_cls = strategy_cls
+        self.params = params
+        self.curve_points = curve_points
+        self.reset(initial_capital, investment_per_trade, trading_method, exit_rules)
+
+    def reset(self, initial_capital: float, investment_per_trade: float, trading_method: int = 0, exit_rules: ExitRules = None):
+        self.initialCapital = initial_capital
+        self.availableCapital = initial_capital
+        self.investment_per_trade = investment_per_trade
+        self.trading_method = trading_method
+        self.exit_rules = exit_rules
+        self.trades = TradeLog(self.panel.index, self.symbols)
+
+    @timed('signals')
+    def compute_signals(self):
+        close = self.panel.xs('close', axis=1, level=1)[self.symbols]
+        self._close = np.ascontiguousarray(close.to_numpy(dtype=np.float64))
+        self._signals = np.zeros(self._close.shape, dtype=np.int8)
+
+        for column, symbol in enumerate(self.symbols):
+            listed = ~np.isnan(self._close[:, column])
+            frame = self.panel[symbol][listed].reset_index()
+            strategy = self.strategy_cls(frame, params=self.params)
+            strategy.compute_signals()
+            signals = strategy._signals
+            self._signals[listed, column] = np.where(signals == 1, 1, np.where(signals == -1, -1, 0))
+
+    def _close_trade(self, trade_index: int, exit_price: float, index_pos: int, reason: str = 'signal'):
+        self.availableCapital += self.trades.close(trade_index, index_pos, exit_price, reason)
+
+    def run_backtest(self) -> StrategyResult:
+        self.compute_signals()
+        return self.execute()
+
+    @timed('engine')
+    def execute(self) -> StrategyResult:
+        close = self._close
+        signals = self._signals
+        bars, width = close.shape
+        dates = self.panel.index
+
+        # last known price per symbol, so gaps in one listing don't break marking
+        marked = pd.DataFrame(close).ffill().to_numpy()
+        previous = np.vstack([np.full((1, width), np.nan), marked[:-1]])
+        move = np.nan_to_num(marked - previous)
+        reference = np.where(np.isnan(previous), close, previous)
+
+        ledger = OpenPositionLedger(self.trading_method)
+        qty_delta = np.zeros((bars, width))
+        by_symbol = np.ascontiguousarray(close.T)
+        pending_exits = []
+
+        def close_exits_through(bar):
+            while pending_exits and pending_exits[0][0] <= bar:
+                exit_bar, trade_index, reason = heapq.heappop(pending_exits)
+                if not self.trades.is_open(trade_index):
+                    continue
+                column = self.trades.column('symbol_index')[trade_index]
+                quantity = ledger.remove(trade_index)
+                self._close_trade(trade_index, close[exit_bar, column], exit_bar, reason)
+                qty_delta[exit_bar, column] -= quantity
+
+        event_bars = np.flatnonzero(signals.any(axis=1))
+        for i in event_bars[event_bars > 0]:
+            close_exits_through(i)
+            sells = np.flatnonzero(signals[i] == -1)
+            if len(sells) and ledger:
+                # descending, so swap-removal never moves a slot we still have to pop
+                for slot in np.sort(ledger.select_many(previous[i], sells))[::-1]:
+                    trade_index, quantity = ledger.pop(slot)
+                    column = self.trades.column('symbol_index')[trade_index]
+                    self._close_trade(trade_index, close[i, column], i)
+                    qty_delta[i, column] -= quantity
+
+            buys = np.flatnonzero(signals[i] == 1)
+            if len(buys):
+                prices = close[i, buys]
+                quantities = self.investment_per_trade // prices
+                tradable = quantities > 0
+                buys, prices, quantities = buys[tradable], prices[tradable], quantities[tradable]
+                costs = quantities * prices
+                # fill in column order until the shared capital runs out
+                filled = np.cumsum(costs) <= self.availableCapital
+                for column, price, quantity in zip(buys[filled], prices[filled], quantities[filled]):
+                    trade_index = self.trades.open(i, price, quantity, column)
+                    ledger.add(trade_index, reference[i, column], quantity, column)
+                    if self.exit_rules:
+                        exit_bar, reason = self.exit_rules.find_exit(by_symbol[column], i, price)
+                        if exit_bar is not None:
+                            heapq.heappush(pending_exits, (exit_bar, trade_index, reason))
+                self.availableCapital -= costs[filled].sum()
+                qty_delta[i, buys[filled]] += quantities[filled]
+
+        close_exits_through(bars - 1)
+
+        held_qty = np.cumsum(qty_delta, axis=0)
+        equity = np.empty(bars)
+        if bars:
+            equity[0] = self.initialCapital
+            equity[1:] = self.initialCapital + np.cumsum((held_qty[1:] * move[1:]).sum(axis=1))
+
+        for trade_index in ledger:
+            self._close_trade(trade_index, marked[-1, self.trades.column('symbol_index')[trade_index]], bars - 1)
+
+        with timer.phase('metrics'):
+            metrics, drawdown = compute_metrics(equity, self.trades.pnl, self.initialCapital)
+
+        with timer.phase('curves'):
+            equity_curve_data, drawdown_curve_data = curve_records(dates, equity, drawdown, self.curve_points)
+        return StrategyResult(
+            **metrics,
+            equityCurve=equity_curve_data,
+            drawdownCurve=drawdown_curve_data,
+            trades=self.trades,
+        )
@@ -0,0 +1,86 @@
+import os
+import sys
+import socket
+import signal
+import logging
+import traceback
+
+# everything a job needs is imported once here; forked children inherit it
+from execute import HOST_TMPFS_BIND, main as run_job
+
+SOCKET_PATH = os.environ.get("RUNNER_SOCKET", "/tmp/runner.sock")
+
+logger = logging.getLogger("runner")
+
+
+def _child(fds):
+    """Runs in the forked child: take over the submitting exec's stdio and
+    run one job. Never returns."""
+    status = 1
+    try:
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        os.chdir(HOST_TMPFS_BIND)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        run_job()
+        status = 0
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+
+def handle(server, conn):
+    _, fds, _, _ = socket.recv_fds(conn, 16, 3)
+    if len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        raise RuntimeError(f"expected stdin/stdout/stderr, got {len(fds)} fds")
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        # user code must not be able to accept the next job's connection
+        server.close()
+        conn.close()
+        _child(fds)
+
+    for fd in fds:
+        os.close(fd)
+    _, wait_status = os.waitpid(pid, 0)
+    status = os.waitstatus_to_exitcode(wait_status)
+    if status < 0:
+        # killed by a signal, report it the way a shell would
+        status = 128 - status
+    conn.sendall(bytes([status & 0xFF]))
+    logger.info(f"Job {pid} finished with status {status}")
+
+
+def serve():
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # bind under a temp name and rename, so clients never see a half-ready socket
+    server.bind(SOCKET_PATH + ".tmp")
+    server.listen(8)
+    os.rename(SOCKET_PATH + ".tmp", SOCKET_PATH)
+    logger.info(f"Runner listening on {SOCKET_PATH}")
+
+    # jobs run one at a time; the pool never hands a container out twice
+    while True:
+        conn, _ = server.accept()
+        with conn:
+            try:
+                handle(server, conn)
+            except Exception as e:
+                logger.error(f"Failed to run job: {str(e)}")
+
+
+if __name__ == "__main__":
+    serve()
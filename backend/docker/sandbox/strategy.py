@@ -5,6 +5,10 @@ from dataclasses import dataclass
 from datetime import datetime
 import numpy as np 
 import heapq
+from metrics import compute_metrics
+from downsample import curve_indices
+from timings import timer, timed
+from checkpoint import SIGNAL_TAIL, Checkpoint, EngineState, data_digest, normalise_signals
 
 @dataclass
 class Trade:
@@ -16,6 +20,126 @@ class Trade:
     side: str
     pnl: float
     exit_reason: str
+    symbol: str = None
+
+# trading_method values: which open trade a sell signal closes
+TRADING_METHODS = {
+    'loss_cutting': 0,
+    'risk_reduction': 1,
+}
+
+EXIT_REASONS = ['signal', 'stop_loss', 'take_profit', 'trailing_stop']
+
+class TradeLog:
+    """Trades stored column-wise: bar positions, prices, quantity, pnl and an
+    exit reason code. Indexing or iterating yields `Trade` records for code
+    that still expects the dataclass; `to_columns()` is the wire format.
+    """
+
+    _columns = (
+        ('entry_index', np.int64), ('exit_index', np.int64), ('entry_price', np.float64),
+        ('exit_price', np.float64), ('quantity', np.float64), ('pnl', np.float64),
+        ('reason', np.int8), ('symbol_index', np.int64),
+    )
+
+    def __init__(self, dates: pd.Index, symbols: List[str] = None, capacity: int = 64):
+        self.dates = dates
+        self.symbols = symbols
+        self._size = 0
+        for name, dtype in self._columns:
+            setattr(self, f"_{name}", np.zeros(capacity, dtype=dtype))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __getitem__(self, trade_index: int) -> Trade:
+        if trade_index < 0:
+            trade_index += self._size
+        if not 0 <= trade_index < self._size:
+            raise IndexError("trade index out of range")
+        is_open = self._exit_index[trade_index] < 0
+        return Trade(
+            entry_date=self.dates[self._entry_index[trade_index]],
+            exit_date=None if is_open else self.dates[self._exit_index[trade_index]],
+            entry_price=self._entry_price[trade_index],
+            exit_price=None if is_open else self._exit_price[trade_index],
+            quantity=self._quantity[trade_index],
+            side='LONG',
+            pnl=self._pnl[trade_index],
+            exit_reason=EXIT_REASONS[self._reason[trade_index]],
+            symbol=self.symbols[self._symbol_index[trade_index]] if self.symbols else None,
+        )
+
+    def __iter__(self):
+        return (self[trade_index] for trade_index in range(self._size))
+
+    def column(self, name: str) -> np.ndarray:
+        return getattr(self, f"_{name}")[:self._size]
+
+    @property
+    def pnl(self) -> np.ndarray:
+        return self.column('pnl')
+
+    def open(self, entry_index: int, price: float, quantity: float, symbol_index: int = 0) -> int:
+        if self._size == len(self._pnl):
+            for name, _ in self._columns:
+                old = getattr(self, f"_{name}")
+                new = np.zeros(2 * len(old), dtype=old.dtype)
+                new[:self._size] = old[:self._size]
+                setattr(self, f"_{name}", new)
+        trade_index = self._size
+        self._entry_index[trade_index] = entry_index
+        self._exit_index[trade_index] = -1
+        self._entry_price[trade_index] = price
+        self._quantity[trade_index] = quantity
+        self._symbol_index[trade_index] = symbol_index
+        self._size += 1
+        return trade_index
+
+    def close(self, trade_index: int, exit_index: int, price: float, reason: str = 'signal') -> float:
+        """Close a trade and return the cash it releases."""
+        quantity = self._quantity[trade_index]
+        self._exit_index[trade_index] = exit_index
+        self._exit_price[trade_index] = price
+        self._pnl[trade_index] = (price - self._entry_price[trade_index]) * quantity
+        self._reason[trade_index] = EXIT_REASONS.index(reason)
+        return quantity * price
+
+    def is_open(self, trade_index: int) -> bool:
+        return self._exit_index[trade_index] < 0
+
+    def snapshot(self) -> dict:
+        return {name: self.column(name).copy() for name, _ in self._columns}
+
+    def restore(self, columns: dict):
+        size = len(columns['pnl'])
+        capacity = max(64, 2 * size)
+        for name, dtype in self._columns:
+            values = np.zeros(capacity, dtype=dtype)
+            values[:size] = columns[name]
+            setattr(self, f"_{name}", values)
+        self._size = size
+
+    def to_columns(self) -> dict:
+        dates = np.asarray(self.dates.astype(str))
+        exit_index = self.column('exit_index')
+        closed = exit_index >= 0
+        exit_dates = np.where(closed, dates[np.where(closed, exit_index, 0)], None)
+        columns = {
+            "entry_date": dates[self.column('entry_index')].tolist(),
+            "exit_date": exit_dates.tolist(),
+            "entry_price": self.column('entry_price').tolist(),
+            "exit_price": np.where(closed, self.column('exit_price'), None).tolist(),
+            "quantity": self.column('quantity').tolist(),
+            "pnl": self.column('pnl').tolist(),
+            "exit_reason": np.asarray(EXIT_REASONS)[self.column('reason')].tolist(),
+        }
+        if self.symbols:
+            columns["symbol"] = np.asarray(self.symbols)[self.column('symbol_index')].tolist()
+        return columns
 
 @dataclass
 class StrategyResult:
@@ -23,7 +147,7 @@ class StrategyResult:
     finalCapital: float
     equityCurve: List[dict]
     drawdownCurve: List[dict]
-    trades: List[Trade]
+    trades: TradeLog
     totalReturn: float
     totalReturnPct: float
     sharpeRatio: float
@@ -39,19 +163,187 @@ class StrategyResult:
     calmarRatio: float | str 
     sortinoRatio: float | str
 
+@dataclass
+class ExitRules:
+    """Per-trade exits as fractions of price: 0.05 on stop_loss exits once the
+    close is 5% under entry, on trailing_stop 5% under the highest close
+    since entry. Rules are checked on closes and fill at that close."""
+    stop_loss: float = None
+    take_profit: float = None
+    trailing_stop: float = None
+
+    @classmethod
+    def from_config(cls, config: dict):
+        rules = cls(config.get('stopLoss'), config.get('takeProfit'), config.get('trailingStop'))
+        return rules if rules else None
+
+    def __bool__(self) -> bool:
+        return bool(self.stop_loss or self.take_profit or self.trailing_stop)
+
+    def find_exit(self, close: np.ndarray, entry: int, entry_price: float, peak: float = None):
+        """First bar after `entry` where a rule fires, as (bar, reason), or (None, None).
+
+        Scans forward in doubling chunks so short-lived trades only touch a
+        few bars; ties go to stop_loss, then trailing_stop, then take_profit.
+        `peak` carries the trailing high over when a scan resumes mid-trade.
+        """
+        peak = entry_price if peak is None else peak
+        start = entry + 1
+        chunk = 256
+        while start < len(close):
+            window = close[start:start + chunk]
+            masks = []
+            if self.stop_loss:
+                masks.append(('stop_loss', window <= entry_price * (1 - self.stop_loss)))
+            if self.trailing_stop:
+                # fmax skips the NaN of a missing bar instead of carrying it forward
+                peaks = np.fmax(peak, np.fmax.accumulate(window))
+                masks.append(('trailing_stop', window <= peaks * (1 - self.trailing_stop)))
+                peak = peaks[-1]
+            if self.take_profit:
+                masks.append(('take_profit', window >= entry_price * (1 + self.take_profit)))
+
+            first = None
+            for reason, mask in masks:
+                hits = np.flatnonzero(mask)
+                if len(hits) and (first is None or hits[0] < first[0]):
+                    first = (hits[0], reason)
+            if first:
+                return start + int(first[0]), first[1]
+            start += len(window)
+            chunk *= 2
+        return None, None
+
+class OpenPositionLedger:
+    """Open positions stored column-wise in growable arrays.
+
+    Each position is marked against a reference price, so its pnl at any
+    close is `(price - ref) * quantity` and nothing has to be rewritten per
+    bar. The engine marks the book to market from its quantity deltas, so
+    only the aggregate quantity is kept here.
+    """
+
+    def __init__(self, trading_method: int = 0, capacity: int = 64):
+        self.trading_method = trading_method
+        self._trade_index = np.empty(capacity, dtype=np.int64)
+        self._symbol = np.empty(capacity, dtype=np.int64)
+        self._ref = np.empty(capacity)
+        self._qty = np.empty(capacity)
+        self._size = 0
+        self.total_quantity = 0.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __iter__(self):
+        return iter(self._trade_index[:self._size].tolist())
+
+    def _grow(self):
+        capacity = 2 * len(self._qty)
+        for name in ('_trade_index', '_symbol', '_ref', '_qty'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def add(self, trade_index: int, ref_price: float, quantity: float, symbol: int = 0):
+        if self._size == len(self._qty):
+            self._grow()
+        self._trade_index[self._size] = trade_index
+        self._symbol[self._size] = symbol
+        self._ref[self._size] = ref_price
+        self._qty[self._size] = quantity
+        self._size += 1
+        self.total_quantity += quantity
+
+    def select(self, price: float) -> int:
+        """Slot of the position to close next: lowest pnl for trading_method 0,
+        highest for 1, oldest trade on ties."""
+        size = self._size
+        pnl = (price - self._ref[:size]) * self._qty[:size]
+        key = pnl if self.trading_method == 0 else -pnl
+        candidates = np.flatnonzero(key == key.min())
+        if len(candidates) == 1:
+            return int(candidates[0])
+        return int(candidates[np.argmin(self._trade_index[candidates])])
+
+    def select_many(self, prices: np.ndarray, symbols: np.ndarray) -> np.ndarray:
+        """Like select(), once per symbol in `symbols`, with `prices` indexed by
+        symbol column. Symbols without an open position are skipped."""
+        size = self._size
+        slots = np.flatnonzero(np.isin(self._symbol[:size], symbols))
+        if len(slots) == 0:
+            return slots
+        symbol = self._symbol[slots]
+        pnl = (prices[symbol] - self._ref[slots]) * self._qty[slots]
+        key = pnl if self.trading_method == 0 else -pnl
+        order = np.lexsort((self._trade_index[slots], key, symbol))
+        _, first = np.unique(symbol[order], return_index=True)
+        return slots[order[first]]
+
+    def remove(self, trade_index: int) -> float:
+        slot = int(np.flatnonzero(self._trade_index[:self._size] == trade_index)[0])
+        return self.pop(slot)[1]
+
+    def snapshot(self) -> dict:
+        size = self._size
+        return {
+            'trade_index': self._trade_index[:size].copy(),
+            'ref': self._ref[:size].copy(),
+            'quantity': self._qty[:size].copy(),
+        }
+
+    def pop(self, slot: int) -> tuple[int, float]:
+        trade_index = int(self._trade_index[slot])
+        quantity = self._qty[slot]
+        last = self._size - 1
+        self._trade_index[slot] = self._trade_index[last]
+        self._symbol[slot] = self._symbol[last]
+        self._ref[slot] = self._ref[last]
+        self._qty[slot] = self._qty[last]
+        self._size = last
+        self.total_quantity -= quantity
+        return trade_index, quantity
+
+def engine_settings(initial_capital: float, investment_per_trade: float, trading_method: int, exit_rules: ExitRules = None) -> tuple:
+    """Everything besides the signals that a checkpointed book depends on."""
+    rules = exit_rules or ExitRules()
+    return (initial_capital, investment_per_trade, trading_method,
+            rules.stop_loss, rules.take_profit, rules.trailing_stop)
+
+def curve_records(dates: pd.Index, equity: np.ndarray, drawdown: np.ndarray, points: int = None):
+    """Equity and drawdown as {"date", "value"} lists, LTTB-downsampled to about
+    `points` shared samples when given."""
+    positions = curve_indices(equity, drawdown, points)
+    labels = dates[positions]
+    return (
+        [{"date": str(date), "value": value} for date, value in zip(labels, equity[positions])],
+        [{"date": str(date), "value": value} for date, value in zip(labels, drawdown[positions])],
+    )
+
 class BaseStrategy(ABC):
-    def __init__(self, data: pd.DataFrame, initial_capital: float = 100000,investment_per_trade:float = 10000,trading_method:int = 0):
+    def __init__(self, data: pd.DataFrame, initial_capital: float = 100000,investment_per_trade:float = 10000,trading_method:int = 0,params: dict = None,exit_rules: ExitRules = None,curve_points: int = None):
         self.data = data
         self.data.set_index('Date', inplace=True)
         self.data.columns = self.data.columns.str.lower()
+        self.params = params
+        self.curve_points = curve_points
+        self.positions = pd.Series(0, index=data.index)
+        self.reset(initial_capital, investment_per_trade, trading_method, exit_rules)
+
+    def reset(self, initial_capital: float, investment_per_trade: float, trading_method: int = 0, exit_rules: ExitRules = None):
+        """Clear engine state so computed signals can be replayed under another configuration."""
         self.initialCapital = initial_capital
         self.availableCapital = initial_capital
         self.currentPosition = 0
-        self.trades: List[Trade] = []
-        self.equityCurve = pd.Series(initial_capital, index=data.index)
-        self.positions = pd.Series(0, index=data.index)
+        self.trades = TradeLog(self.data.index)
+        self.equityCurve = pd.Series(initial_capital, index=self.data.index)
         self.investment_per_trade = investment_per_trade
         self.trading_method = trading_method
+        self.exit_rules = exit_rules
         self.max_positions = -1;
 
     @abstractmethod
@@ -132,115 +424,214 @@ class BaseStrategy(ABC):
             return "∞" if excess_returns.mean() > 0 else 0.0
         return np.sqrt(252) * excess_returns.mean() / downside_returns.std()
 
-    def _close_trade(self, trade:Trade , exit_price,index_pos):
-        trade.exit_date = self.data.index[index_pos]
-        trade.exit_price = exit_price
-        trade.pnl = (exit_price - trade.entry_price) * trade.quantity
-
-        replenishedCapital = trade.quantity * exit_price
+    def _close_trade(self, trade_index: int, exit_price, index_pos, reason: str = 'signal'):
+        replenishedCapital = self.trades.close(trade_index, index_pos, exit_price, reason)
         self.availableCapital += replenishedCapital
 
 
-    def run_backtest(self) -> StrategyResult:
-        try:
-            self.generate_signals.__func__(self.data)   
-        except AttributeError:
-            type(self).generate_signals(self.data)
-        if 'signal' not in self.data.columns:
+    def compute_signals(self, first_bar: int = 0):
+        """Run generate_signals over the data, or only over the bars from
+        `first_bar` on; earlier bars then carry no signal."""
+        data = self.data if not first_bar else self.data.iloc[first_bar:].copy(deep=False)
+        args = (data,) if self.params is None else (data, self.params)
+        with timer.phase('signals'):
+            try:
+                self.generate_signals.__func__(*args)   
+            except AttributeError:
+                type(self).generate_signals(*args)
+        if 'signal' not in data.columns:
             raise ValueError("No 'signal' column found in DataFrame. Implement generate_signals() correctly.")
 
-        signals = self.data['signal']
-        self.openTrades = []
-        heapq.heapify(self.openTrades)
-        loop_count =0
-        for i in range(1, len(self.data)):
-            price = self.data['close'].iloc[i]
-            loop_count+=1;
-            if signals.iloc[i] == 1:
+        self._close = np.ascontiguousarray(self.data['close'].to_numpy(dtype=np.float64))
+        signals = np.ascontiguousarray(data['signal'].to_numpy())
+        if first_bar:
+            signals = np.concatenate([np.zeros(first_bar, dtype=signals.dtype), signals])
+        self._signals = signals
+        return self._signals
+
+    def resume_signals(self, checkpoint: Checkpoint, lookback: int) -> bool:
+        """Signals for a run that extends `checkpoint`, recomputed only over the
+        bars from `lookback` before the checkpoint's signal tail on.
+
+        `lookback` is the most bars of history the strategy declares any
+        signal depends on; the signals of user code can't be proven local
+        otherwise. The checkpointed bars must be unchanged and the tail must
+        come out the same again. Returns False when the caller needs a full
+        compute_signals().
+        """
+        bars = checkpoint.bars
+        close = self.data['close'].to_numpy(dtype=np.float64)
+        if bars > len(self.data):
+            return False
+        if checkpoint.digest != data_digest(self.data.index[:bars], close[:bars]):
+            return False
+        tail = bars - len(checkpoint.signals)
+        # every bar from the tail on sees its full lookback
+        self.compute_signals(max(0, tail - lookback))
+        return np.array_equal(normalise_signals(self._signals[tail:bars]), checkpoint.signals)
+
+    def checkpoint(self) -> Checkpoint:
+        """Signal side of a checkpoint over every bar; engine states are added per trading method."""
+        bars = len(self.data)
+        tail = min(bars, SIGNAL_TAIL)
+        return Checkpoint(
+            bars=bars,
+            digest=data_digest(self.data.index, self._close),
+            signals=normalise_signals(self._signals[bars - tail:]),
+        )
+
+    def settings(self) -> tuple:
+        return engine_settings(self.initialCapital, self.investment_per_trade, self.trading_method, self.exit_rules)
+
+    def engine_state(self) -> EngineState:
+        """Book as it stood on the last bar of the latest full execute(), with
+        the trades that were marked closed there open again."""
+        trades = self.trades.snapshot()
+        open_trades = self.openTrades.snapshot()
+        opened = open_trades['trade_index']
+        trades['exit_index'][opened] = -1
+        trades['exit_price'][opened] = 0.0
+        trades['pnl'][opened] = 0.0
+        trades['reason'][opened] = 0
+
+        close = self._close
+        open_trades['peak'] = np.array([
+            max(trades['entry_price'][trade_index], np.nanmax(close[trades['entry_index'][trade_index] + 1:], initial=-np.inf))
+            for trade_index in opened
+        ], dtype=np.float64)
+        return EngineState(
+            bars=len(close),
+            settings=self.settings(),
+            capital=self._capital_before_close,
+            equity=self.equityCurve.to_numpy(dtype=np.float64).copy(),
+            trades=trades,
+            open_trades=open_trades,
+            max_positions=self.max_positions,
+        )
+
+    def _restore(self, state: EngineState, close: np.ndarray, pending_exits: list):
+        """Load a checkpointed book. `close` starts at the checkpoint's last
+        bar, so open trades are scanned for stop exits from the next one."""
+        self.trades.restore(state.trades)
+        self.availableCapital = state.capital
+        self.max_positions = state.max_positions
+        open_trades = state.open_trades
+        for trade_index, ref, quantity, peak in zip(open_trades['trade_index'].tolist(), open_trades['ref'],
+                                                    open_trades['quantity'], open_trades['peak']):
+            self.openTrades.add(trade_index, ref, quantity)
+            if self.exit_rules:
+                entry_price = self.trades.column('entry_price')[trade_index]
+                exit_bar, reason = self.exit_rules.find_exit(close, 0, entry_price, peak)
+                if exit_bar is not None:
+                    heapq.heappush(pending_exits, (exit_bar, trade_index, reason))
+        return state.equity[-1], self.openTrades.total_quantity, len(self.openTrades)
+
+    def run_backtest(self) -> StrategyResult:
+        self.compute_signals()
+        return self.execute()
+
+    @timed('engine')
+    def execute(self, start: int = 0, stop: int = None, curves: bool = True, signals: np.ndarray = None, resume_from: EngineState = None) -> StrategyResult:
+        """Run the engine over signals already produced by compute_signals().
+
+        `start`/`stop` restrict the run to a window of bars; the arrays are
+        sliced as views, so windows never copy the data. `signals` replays a
+        signal array computed elsewhere over this strategy's prices. With
+        `curves=False` the per-bar equity and drawdown lists are left empty.
+        `resume_from` picks up a checkpointed book and only runs the bars
+        after it.
+        """
+        if resume_from is not None:
+            start, stop = resume_from.bars - 1, None
+        close = self._close[start:stop]
+        signals = (self._signals if signals is None else signals)[start:stop]
+        dates = self.data.index[start:stop]
+        n = len(close)
+
+        self.openTrades = OpenPositionLedger(self.trading_method)
+        qty_delta = np.zeros(n)
+        count_delta = np.zeros(n, dtype=np.int64)
+
+        # (bar, trade_index, reason) of every pending stop exit; stale once the trade closes on a signal
+        pending_exits = []
+        base_equity, base_quantity, base_count = self.initialCapital, 0.0, 0
+        if resume_from is not None:
+            base_equity, base_quantity, base_count = self._restore(resume_from, close, pending_exits)
+
+        def close_exits_through(bar):
+            while pending_exits and pending_exits[0][0] <= bar:
+                exit_bar, trade_index, reason = heapq.heappop(pending_exits)
+                if not self.trades.is_open(trade_index):
+                    continue
+                quantity = self.openTrades.remove(trade_index)
+                self._close_trade(trade_index, close[exit_bar], start + exit_bar, reason)
+                qty_delta[exit_bar] -= quantity
+                count_delta[exit_bar] -= 1
+
+        # only bars carrying a signal can change the book; everything else is pure mark-to-market
+        event_bars = np.flatnonzero((signals == 1) | (signals == -1))
+        for i in event_bars[event_bars > 0]:
+            # stops fire before the bar's signal, so their cash is available to it
+            close_exits_through(i)
+            price = close[i]
+            if signals[i] == 1:
                 quantity = self.investment_per_trade // price
 
                 if quantity > 0 : 
                     trade_cost = quantity * price
 
                     if trade_cost  <= self.availableCapital:
-                        new_trade = Trade(
-                            entry_date=self.data.index[i],
-                            exit_date=None,
-                            entry_price=price,
-                            exit_price=None,
-                            quantity=quantity,
-                            side='LONG', 
-                            pnl=0,
-                            exit_reason='signal'
-                        )
-                        self.currentPosition+=1
-                        trade_index = len(self.trades)
-                        self.trades.append(new_trade)
-                        key = new_trade.pnl if self.trading_method == 0 else -new_trade.pnl
-                        heapq.heappush(self.openTrades, (key,trade_index))
+                        trade_index = self.trades.open(start + i, price, quantity)
+                        # marked from the previous close, matching the entry-bar pnl the old loop booked
+                        self.openTrades.add(trade_index, close[i - 1], quantity)
                         self.availableCapital -= trade_cost
-
-            elif signals.iloc[i] == -1:
-                if self.openTrades:
-                    _, trade_index = heapq.heappop(self.openTrades)
-                    trade = self.trades[trade_index]
-                    self._close_trade(trade, price, i)
-                    self.currentPosition-=1
-
-    
-            self.equityCurve.iloc[i] = self.equityCurve.iloc[i - 1]
-
-            updated_open_trades = []
-            
-            for _, trade_index in list(self.openTrades):
-                open_trade = self.trades[trade_index]
-                price_change = self.data['close'].iloc[i]-self.data['close'].iloc[i - 1]
-                daily_pnl = price_change * open_trade.quantity
-                self.equityCurve.iloc[i] += daily_pnl
-                open_trade.pnl+=daily_pnl
-
-                updated_key = open_trade.pnl if self.trading_method == 0 else -open_trade.pnl
-                updated_open_trades.append((updated_key, trade_index))
-            
-            self.max_positions = max(self.max_positions,self.currentPosition)
-            self.openTrades = updated_open_trades
-            heapq.heapify(self.openTrades)
- 
+                        qty_delta[i] += quantity
+                        count_delta[i] += 1
+                        if self.exit_rules:
+                            exit_bar, reason = self.exit_rules.find_exit(close, i, price)
+                            if exit_bar is not None:
+                                heapq.heappush(pending_exits, (exit_bar, trade_index, reason))
+
+            elif self.openTrades:
+                # ranked on pnl as of the previous close, before this bar's move is booked
+                trade_index, quantity = self.openTrades.pop(self.openTrades.select(close[i - 1]))
+                self._close_trade(trade_index, price, start + i)
+                qty_delta[i] -= quantity
+                count_delta[i] -= 1
+
+        close_exits_through(n - 1)
+
+        held_qty = np.cumsum(qty_delta)
+        equity = np.empty(n)
+        if n:
+            equity[0] = base_equity
+            equity[1:] = base_equity + np.cumsum((base_quantity + held_qty[1:]) * np.diff(close))
+        if resume_from is not None:
+            equity = np.concatenate([resume_from.equity[:-1], equity])
+            dates = self.data.index
+        self.equityCurve = pd.Series(equity, index=dates)
+
+        if n > 1:
+            position_counts = base_count + np.cumsum(count_delta)
+            self.currentPosition = int(position_counts[-1])
+            self.max_positions = max(self.max_positions, int(position_counts[1:].max()))
+
+        self._capital_before_close = self.availableCapital
         if self.openTrades:
-            last_price = self.data['close'].iloc[-1]
-            while self.openTrades: 
-                priority_key, trade_index = heapq.heappop(self.openTrades)
-                trade_to_close = self.trades[trade_index]
-                self._close_trade(trade_to_close, last_price, len(self.data) - 1)
-
-        # print(f"loop_count = {loop_count}")
-        equity_curve_data = [
-            {"date": str(date), "value": value}
-            for date, value in self.equityCurve.items()
-        ]
-        
-        drawdown_curve_data = [
-            {"date": str(date), "value": value}
-            for date, value in self.calculate_drawdown_curve().items()
-        ] 
+            last_price = close[-1]
+            for trade_index in self.openTrades:
+                self._close_trade(trade_index, last_price, start + n - 1)
+
+        with timer.phase('metrics'):
+            metrics, drawdown = compute_metrics(equity, self.trades.pnl, self.initialCapital)
+
+        with timer.phase('curves'):
+            equity_curve_data, drawdown_curve_data = (
+                curve_records(dates, equity, drawdown, self.curve_points) if curves else ([], [])
+            )
 
         return StrategyResult(
-            initialCapital=self.initialCapital,
-            finalCapital=self.calculate_final_capital(),
-            totalReturn=self.calculate_total_return(),
-            totalReturnPct=self.calculate_total_return_pct(),
-            sharpeRatio=self.calculate_sharpe_ratio(),
-            maxDrawdown=self.calculate_max_drawdown(),
-            maxDrawdownPct=self.calculate_max_drawdown_pct(),
-            winRate=self.calculate_win_rate(),
-            profitFactor=self.calculate_profit_factor(),
-            numTrades=len(self.trades),
-            avgTradePnl=self.calculate_avg_trade_pnl(),
-            avgWinnerPnl=self.calculate_avg_winner_pnl(),
-            avgLoserPnl=self.calculate_avg_loser_pnl(),
-            annualizedVolatility=self.calculate_annualized_volatility(),
-            calmarRatio=self.calculate_calmar_ratio(),
-            sortinoRatio=self.calculate_sortino_ratio(),
+            **metrics,
             equityCurve=equity_curve_data,
             drawdownCurve=drawdown_curve_data,
             trades=self.trades,
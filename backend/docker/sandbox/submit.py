@@ -0,0 +1,26 @@
+"""Hand this exec's stdin/stdout/stderr to the warm runner and exit with the
+job's status. Meant to be run as `python -I -S submit.py`, so it only touches
+the standard library and starts in a few milliseconds."""
+import os
+import sys
+import socket
+
+SOCKET_PATH = os.environ.get("RUNNER_SOCKET", "/tmp/runner.sock")
+
+
+def main():
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(SOCKET_PATH)
+    except OSError:
+        # runner still warming up or gone; run the job in a fresh interpreter
+        execute_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "execute.py")
+        os.execv(sys.executable, [sys.executable, execute_path])
+
+    socket.send_fds(client, [b"run"], [0, 1, 2])
+    status = client.recv(1)
+    sys.exit(status[0] if status else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from downsample import curve_indices, lttb_indices
+
+
+def curves(n, seed=0):
+    rng = np.random.default_rng(seed)
+    equity = 100000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    peak = np.maximum.accumulate(equity)
+    return equity, (equity - peak) / peak
+
+@pytest.mark.parametrize("n, points", [(100000, 300), (20000, 500), (5000, 100), (1000, 999)])
+def test_fills_point_budget(n, points):
+    equity, drawdown = curves(n)
+    positions = curve_indices(equity, drawdown, points)
+    assert points * 0.95 <= len(positions) <= points
+    assert positions[0] == 0 and positions[-1] == n - 1
+    assert np.all(np.diff(positions) > 0)
+
+def test_keeps_drawdown_extremes():
+    equity, drawdown = curves(50000, seed=3)
+    positions = curve_indices(equity, drawdown, 200)
+    trough = int(np.argmin(drawdown))
+    assert trough in positions
+    assert int(np.argmax(equity[:trough + 1])) in positions
+
+def test_full_resolution_without_budget():
+    equity, drawdown = curves(100)
+    assert len(curve_indices(equity, drawdown, None)) == 100
+    assert len(curve_indices(equity, drawdown, 500)) == 100
+
+def test_lttb_returns_requested_count():
+    equity, _ = curves(10000)
+    assert len(lttb_indices(equity, 250)) == 250
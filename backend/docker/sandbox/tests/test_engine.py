@@ -0,0 +1,74 @@
+import math
+from dataclasses import fields
+import numpy as np
+import pandas as pd
+import pytest
+import strategy
+import reference_engine
+
+TRADE_FIELDS = ('entry_date', 'exit_date', 'entry_price', 'exit_price', 'quantity', 'side', 'pnl', 'exit_reason')
+
+
+def price_frame(n, seed, buy=0.1, sell=0.08):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    signal = rng.choice([0, 1, -1], size=n, p=[1 - buy - sell, buy, sell])
+    dates = pd.date_range("2000-01-01", periods=n).strftime("%Y-%m-%d")
+    return pd.DataFrame({"Date": dates, "Open": close, "Close": close, "sig": signal})
+
+def replay(data):
+    data['signal'] = data['sig']
+
+def run(module, df, trading_method, initial_capital=100000.0, investment_per_trade=10000.0):
+    cls = type("Strategy", (module.BaseStrategy,), {"generate_signals": replay})
+    return cls(df.copy(), initial_capital=initial_capital, investment_per_trade=investment_per_trade,
+               trading_method=trading_method).run_backtest()
+
+def assert_same_value(actual, expected, path):
+    if isinstance(expected, str) or isinstance(actual, str) or expected is None or actual is None:
+        assert actual == expected, path
+    elif math.isnan(expected):
+        assert math.isnan(actual), path
+    else:
+        assert math.isclose(actual, expected, rel_tol=1e-9, abs_tol=1e-6), (path, actual, expected)
+
+def assert_same_result(actual, expected):
+    """Every StrategyResult field and every trade of `actual` matches the reference run."""
+    for field in fields(reference_engine.StrategyResult):
+        name = field.name
+        got, want = getattr(actual, name), getattr(expected, name)
+        if name == 'trades':
+            assert len(got) == len(want), name
+            for position, (trade, reference) in enumerate(zip(got, want)):
+                for column in TRADE_FIELDS:
+                    assert_same_value(getattr(trade, column), getattr(reference, column), f"trades[{position}].{column}")
+        elif name in ('equityCurve', 'drawdownCurve'):
+            assert [point['date'] for point in got] == [point['date'] for point in want], name
+            for position, (point, reference) in enumerate(zip(got, want)):
+                assert_same_value(point['value'], reference['value'], f"{name}[{position}]")
+        else:
+            assert_same_value(got, want, name)
+
+
+@pytest.mark.parametrize("trading_method", [0, 1])
+@pytest.mark.parametrize("seed", range(24))
+def test_matches_reference_loop(seed, trading_method):
+    n = [1, 2, 5, 50, 500, 2000][seed % 6]
+    buy, sell = [(0.1, 0.08), (0.3, 0.05), (0.02, 0.3)][seed % 3]
+    df = price_frame(n, seed, buy, sell)
+    assert_same_result(run(strategy, df, trading_method), run(reference_engine, df, trading_method))
+
+@pytest.mark.parametrize("trading_method", [0, 1])
+def test_capital_runs_out(trading_method):
+    # most buys are refused for lack of cash
+    df = price_frame(800, 7, buy=0.5, sell=0.05)
+    assert_same_result(
+        run(strategy, df, trading_method, initial_capital=30000.0),
+        run(reference_engine, df, trading_method, initial_capital=30000.0),
+    )
+
+def test_no_signals():
+    df = price_frame(300, 3, buy=0.0, sell=0.0)
+    result = run(strategy, df, 0)
+    assert_same_result(result, run(reference_engine, df, 0))
+    assert result.numTrades == 0 and result.finalCapital == 100000.0
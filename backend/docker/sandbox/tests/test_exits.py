@@ -0,0 +1,111 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+import strategy
+from strategy import ExitRules
+
+
+def per_bar_reference(close, signal, initial_capital, investment_per_trade, trading_method, rules):
+    """Walks every bar and checks every open trade's stops one close at a
+    time: the slow, obvious version of the engine with exit rules. Returns
+    (trades, equity) with trades as (exit_bar, exit_reason, pnl)."""
+    n = len(close)
+    trades, book = [], []
+    capital = initial_capital
+    equity = [initial_capital]
+
+    def close_trade(trade, bar, reason):
+        nonlocal capital
+        trade.update(exit_bar=bar, exit_price=close[bar], reason=reason)
+        capital += trade['quantity'] * close[bar]
+
+    for i in range(1, n):
+        # stops fire on the close, before the bar's signal
+        for trade in list(book):
+            trade['peak'] = max(trade['peak'], close[i])
+            reason = None
+            if rules.stop_loss and close[i] <= trade['entry_price'] * (1 - rules.stop_loss):
+                reason = 'stop_loss'
+            elif rules.trailing_stop and close[i] <= trade['peak'] * (1 - rules.trailing_stop):
+                reason = 'trailing_stop'
+            elif rules.take_profit and close[i] >= trade['entry_price'] * (1 + rules.take_profit):
+                reason = 'take_profit'
+            if reason:
+                book.remove(trade)
+                close_trade(trade, i, reason)
+
+        if signal[i] == 1:
+            quantity = investment_per_trade // close[i]
+            if quantity > 0 and quantity * close[i] <= capital:
+                trade = dict(index=len(trades), entry_price=close[i], quantity=quantity,
+                             ref=close[i - 1], peak=close[i], exit_bar=None)
+                trades.append(trade)
+                book.append(trade)
+                capital -= quantity * close[i]
+        elif signal[i] == -1 and book:
+            # same ranking as the reference loop: pnl since the bar before entry, oldest on ties
+            sign = 1 if trading_method == 0 else -1
+            trade = min(book, key=lambda t: (sign * (close[i - 1] - t['ref']) * t['quantity'], t['index']))
+            book.remove(trade)
+            close_trade(trade, i, 'signal')
+
+        held = sum(trade['quantity'] for trade in book)
+        equity.append(equity[-1] + held * (close[i] - close[i - 1]))
+
+    for trade in book:
+        close_trade(trade, n - 1, 'signal')
+    return [(t['exit_bar'], t['reason'], (t['exit_price'] - t['entry_price']) * t['quantity']) for t in trades], equity
+
+RULES = [
+    ExitRules(stop_loss=0.05),
+    ExitRules(take_profit=0.08),
+    ExitRules(trailing_stop=0.06),
+    ExitRules(stop_loss=0.05, take_profit=0.1, trailing_stop=0.04),
+    ExitRules(stop_loss=0.03, take_profit=0.03),
+]
+
+@pytest.mark.parametrize("trading_method", [0, 1])
+@pytest.mark.parametrize("seed", range(10))
+def test_matches_per_bar_reference(seed, trading_method):
+    rng = np.random.default_rng(seed)
+    n = 400
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    signal = rng.choice([0, 1, -1], size=n, p=[0.8, 0.15, 0.05])
+    rules = RULES[seed % len(RULES)]
+    df = pd.DataFrame({"Date": pd.date_range("2000-01-01", periods=n).strftime("%Y-%m-%d"), "Close": close, "sig": signal})
+    cls = type("Strategy", (strategy.BaseStrategy,), {"generate_signals": lambda data: data.__setitem__('signal', data['sig'])})
+
+    dates = df['Date'].tolist()
+    result = cls(df, 100000.0, 10000.0, trading_method, exit_rules=rules).run_backtest()
+    expected_trades, expected_equity = per_bar_reference(close, signal, 100000.0, 10000.0, trading_method, rules)
+
+    assert len(result.trades) == len(expected_trades)
+    for trade, (exit_bar, reason, pnl) in zip(result.trades, expected_trades):
+        assert trade.exit_date == dates[exit_bar]
+        assert trade.exit_reason == reason
+        assert math.isclose(trade.pnl, pnl, rel_tol=1e-9, abs_tol=1e-6)
+    assert np.allclose([point['value'] for point in result.equityCurve], expected_equity, rtol=1e-9)
+
+def test_exit_reasons_recorded():
+    close = np.array([100.0, 100.0, 94.0, 100.0, 100.0, 111.0, 100.0])
+    signal = np.array([0, 1, 0, 1, 0, 0, 0])
+    df = pd.DataFrame({"Date": pd.date_range("2000-01-01", periods=len(close)).strftime("%Y-%m-%d"), "Close": close, "sig": signal})
+    cls = type("Strategy", (strategy.BaseStrategy,), {"generate_signals": lambda data: data.__setitem__('signal', data['sig'])})
+    result = cls(df, 100000.0, 10000.0, exit_rules=ExitRules(stop_loss=0.05, take_profit=0.1)).run_backtest()
+    assert [trade.exit_reason for trade in result.trades] == ['stop_loss', 'take_profit']
+
+def test_find_exit_across_chunks():
+    # the stop sits past the first 256-bar scan chunk
+    close = np.full(1000, 100.0)
+    close[700] = 90.0
+    assert ExitRules(stop_loss=0.05).find_exit(close, 0, 100.0) == (700, 'stop_loss')
+    assert ExitRules(stop_loss=0.2).find_exit(close, 0, 100.0) == (None, None)
+
+def test_trailing_stop_through_missing_bars():
+    # a panel symbol is NaN on bars it has no data for
+    close = np.array([100.0, 110.0, np.nan, np.nan, 108.0, 120.0, np.nan, 101.0])
+    assert ExitRules(trailing_stop=0.1).find_exit(close, 0, 100.0) == (7, 'trailing_stop')
+    assert ExitRules(trailing_stop=0.2).find_exit(close, 0, 100.0) == (None, None)
+    # resumed with a peak carried over from an earlier scan
+    assert ExitRules(trailing_stop=0.1).find_exit(close, 2, 100.0, peak=130.0) == (4, 'trailing_stop')
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+import strategy
+import reference_engine
+from strategy import OpenPositionLedger
+from test_engine import assert_same_result, run
+
+
+def tied_frame(n, seed, buy=0.5, sell=0.1):
+    """Whole-number prices on a narrow walk, so many open trades carry
+    exactly the same pnl and the ledger's tie-breaking decides the exits."""
+    rng = np.random.default_rng(seed)
+    close = 100.0 + np.clip(np.cumsum(rng.integers(-1, 2, n)), -20, 20)
+    signal = rng.choice([0, 1, -1], size=n, p=[1 - buy - sell, buy, sell])
+    dates = pd.date_range("2000-01-01", periods=n).strftime("%Y-%m-%d")
+    return pd.DataFrame({"Date": dates, "Open": close, "Close": close, "sig": signal})
+
+
+@pytest.mark.parametrize("trading_method", [0, 1])
+@pytest.mark.parametrize("seed", range(4))
+def test_ties_match_reference_loop(seed, trading_method):
+    df = tied_frame(200, seed)
+    assert_same_result(
+        run(strategy, df, trading_method, initial_capital=1e7, investment_per_trade=1000.0),
+        run(reference_engine, df, trading_method, initial_capital=1e7, investment_per_trade=1000.0),
+    )
+
+@pytest.mark.parametrize("trading_method", [0, 1])
+def test_pyramiding_matches_reference_loop(trading_method):
+    # hundreds of positions open at once
+    df = tied_frame(300, 11, buy=0.8, sell=0.05)
+    cls = type("Strategy", (strategy.BaseStrategy,), {"generate_signals": lambda data: data.__setitem__('signal', data['sig'])})
+    engine = cls(df.copy(), initial_capital=1e8, investment_per_trade=1000.0, trading_method=trading_method)
+    result = engine.run_backtest()
+    assert engine.max_positions > 200
+    assert_same_result(result, run(reference_engine, df, trading_method, initial_capital=1e8, investment_per_trade=1000.0))
+
+def test_select_prefers_oldest_trade_on_ties():
+    ledger = OpenPositionLedger(trading_method=0)
+    for trade_index, ref in [(4, 10.0), (1, 10.0), (7, 10.0), (2, 12.0)]:
+        ledger.add(trade_index, ref, 1.0)
+    # trade 2 has the lowest pnl
+    assert ledger.pop(ledger.select(11.0))[0] == 2
+    # the rest tie, oldest trade first
+    assert ledger.pop(ledger.select(11.0))[0] == 1
+    assert ledger.pop(ledger.select(11.0))[0] == 4
+    assert list(ledger) == [7]
+
+def test_select_highest_pnl_for_risk_reduction():
+    ledger = OpenPositionLedger(trading_method=1)
+    for trade_index, ref, quantity in [(0, 10.0, 1.0), (1, 8.0, 1.0), (2, 9.0, 2.0), (3, 9.0, 2.0)]:
+        ledger.add(trade_index, ref, quantity)
+    # 2 and 3 tie on the highest pnl
+    assert ledger.pop(ledger.select(11.0))[0] == 2
+    assert ledger.pop(ledger.select(11.0))[0] == 3
+    assert ledger.pop(ledger.select(11.0))[0] == 1
+    assert ledger.total_quantity == 1.0
+
+def test_select_many_picks_per_symbol():
+    ledger = OpenPositionLedger(trading_method=0)
+    ledger.add(0, 10.0, 1.0, symbol=0)
+    ledger.add(1, 12.0, 1.0, symbol=0)
+    ledger.add(2, 5.0, 1.0, symbol=1)
+    ledger.add(3, 5.0, 1.0, symbol=1)
+    ledger.add(4, 1.0, 1.0, symbol=2)
+    prices = np.array([11.0, 6.0, 2.0])
+    slots = ledger.select_many(prices, np.array([0, 1]))
+    assert sorted(ledger._trade_index[slots].tolist()) == [1, 2]
+
+def test_grows_past_capacity():
+    ledger = OpenPositionLedger(capacity=2)
+    for trade_index in range(100):
+        ledger.add(trade_index, 1.0, 2.0)
+    assert len(ledger) == 100 and ledger.total_quantity == 200.0
+    assert ledger.remove(50) == 2.0
+    assert 50 not in list(ledger) and len(ledger) == 99
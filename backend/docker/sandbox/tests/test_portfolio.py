@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+import strategy
+from portfolio import PortfolioBacktest
+from strategy import ExitRules
+from test_engine import assert_same_result, price_frame, replay
+
+Replay = type("Strategy", (strategy.BaseStrategy,), {"generate_signals": replay})
+
+
+def panel(frames):
+    """Outer-joined date x (symbol, field) panel, the way fetch_panel builds it."""
+    return pd.concat({symbol: frame.set_index('Date') for symbol, frame in frames.items()}, axis=1).sort_index()
+
+def frame(close, signal, start="2000-01-01"):
+    close = np.asarray(close, dtype=float)
+    dates = pd.date_range(start, periods=len(close)).strftime("%Y-%m-%d")
+    return pd.DataFrame({"Date": dates, "Close": close, "sig": signal})
+
+def run_portfolio(frames, trading_method=0, initial_capital=100000.0, exit_rules=None):
+    backtest = PortfolioBacktest(panel(frames), Replay, initial_capital=initial_capital,
+                                 investment_per_trade=10000.0, trading_method=trading_method, exit_rules=exit_rules)
+    return backtest, backtest.run_backtest()
+
+
+@pytest.mark.parametrize("trading_method", [0, 1])
+@pytest.mark.parametrize("seed", range(6))
+def test_one_symbol_matches_single_engine(seed, trading_method):
+    df = price_frame(600, seed, buy=0.15, sell=0.08)
+    rules = ExitRules(stop_loss=0.05, trailing_stop=0.08) if seed % 2 else None
+    single = Replay(df.copy(), initial_capital=100000.0, investment_per_trade=10000.0,
+                    trading_method=trading_method, exit_rules=rules).run_backtest()
+    _, result = run_portfolio({"AAA": df}, trading_method, exit_rules=rules)
+    assert_same_result(result, single)
+
+def test_capital_is_shared():
+    # both buy on the same bars; cash for two positions, filled in column order
+    close = np.full(6, 100.0)
+    signal = [0, 1, 1, 1, 0, 0]
+    backtest, result = run_portfolio({"AAA": frame(close, signal), "BBB": frame(close, signal)}, initial_capital=20000.0)
+    columns = result.trades.to_columns()
+    assert columns["symbol"] == ["AAA", "BBB"]
+    assert columns["entry_date"] == ["2000-01-02", "2000-01-02"]
+    assert backtest.availableCapital == 20000.0
+    assert result.finalCapital == 20000.0
+
+def test_missing_bars():
+    # BBB has no rows on some dates: it is marked at its last price, as if
+    # those bars were flat, and its trailing stop still fires after the gap
+    a = frame([100.0] * 8, [0] * 8)
+    b = frame([100.0, 110.0, 108.0, 120.0, 101.0], [0, 1, 0, 0, 0])
+    b['Date'] = a['Date'].iloc[[0, 1, 4, 5, 7]].to_numpy()
+    rules = ExitRules(trailing_stop=0.1)
+    _, result = run_portfolio({"AAA": a, "BBB": b}, exit_rules=rules)
+
+    columns = result.trades.to_columns()
+    assert columns["symbol"] == ["BBB"]
+    assert columns["exit_reason"] == ["trailing_stop"]
+    assert columns["exit_date"] == ["2000-01-08"]
+    assert np.isfinite([point['value'] for point in result.equityCurve]).all()
+
+    flat = frame([100.0, 110.0, 110.0, 110.0, 108.0, 120.0, 120.0, 101.0], [0, 1, 0, 0, 0, 0, 0, 0])
+    single = Replay(flat, initial_capital=100000.0, investment_per_trade=10000.0, exit_rules=rules).run_backtest()
+    assert_same_result(result, single)
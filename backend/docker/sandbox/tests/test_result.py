@@ -0,0 +1,31 @@
+import json
+import math
+import msgpack
+import numpy as np
+import execute
+from test_engine import price_frame, replay
+import strategy
+
+
+def test_json_safe_replaces_non_finite():
+    value = {
+        "a": [1.0, float("inf"), {"b": float("-inf")}],
+        "c": np.array([np.nan, 2.0]),
+        "d": (np.float64("nan"), np.float32(1.5)),
+        "e": "∞",
+    }
+    assert execute.json_safe(value) == {"a": [1.0, None, {"b": None}], "c": [None, 2.0], "d": [None, 1.5], "e": "∞"}
+
+def test_no_trade_result_is_strict_json(tmp_path, monkeypatch):
+    monkeypatch.setattr(execute, "RESULT_PATH", str(tmp_path / "result.msgpack"))
+    cls = type("Strategy", (strategy.BaseStrategy,), {"generate_signals": replay})
+    engine = cls(price_frame(300, 3, buy=0.0, sell=0.0))
+    results = execute.run_trading_methods(engine, {'initialCapital': 100000.0, 'investmentPerTrade': 10000.0})
+    assert any(isinstance(value, float) and not math.isfinite(value)
+               for result in results.values() for value in result.values())
+
+    execute.write_result({"results": results, "scores": [execute.objective_value("∞"), execute.objective_value(None)]})
+    with open(tmp_path / "result.msgpack", "rb") as f:
+        output = msgpack.unpackb(f.read(), raw=False)
+    json.dumps(output, allow_nan=False)
+    assert output["scores"] == [None, None]
@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import pytest
+import execute
+import strategy
+from checkpoint import Checkpoint
+from test_engine import assert_same_result
+
+
+def frame(close):
+    dates = pd.date_range("2000-01-01", periods=len(close)).strftime("%Y-%m-%d")
+    return pd.DataFrame({"Date": dates, "Open": close, "High": close, "Low": close, "Close": close, "Volume": 1.0})
+
+def crossover(data):
+    # a signal reads 60 bars of history: the slow mean and its shift
+    fast = data['close'].rolling(5).mean()
+    slow = data['close'].rolling(59).mean()
+    data['signal'] = 0
+    data.loc[(fast > slow) & (fast.shift() <= slow.shift()), 'signal'] = 1
+    data.loc[(fast < slow) & (fast.shift() >= slow.shift()), 'signal'] = -1
+    data.loc[data['close'].pct_change() > 0.03, 'signal'] = 1
+
+def new_high(data):
+    # depends on every bar before it
+    data['ret'] = data['close'].pct_change()
+    data['signal'] = np.where(data['close'] >= data['close'].cummax(), 1, 0)
+    data.loc[data['ret'] < -0.03, 'signal'] = -1
+
+def run(generate_signals, close, config, checkpoint=None):
+    cls = type("Strategy", (strategy.BaseStrategy,), {"generate_signals": generate_signals})
+    engine = cls(frame(close), initial_capital=config['initialCapital'], investment_per_trade=config['investmentPerTrade'])
+    results, resumed, next_checkpoint = execute.run_resumable(engine, config, checkpoint)
+    if next_checkpoint is not None:
+        next_checkpoint = Checkpoint.unpack(next_checkpoint.pack())
+    return results, resumed, next_checkpoint
+
+def assert_same_results(actual, expected):
+    assert actual.keys() == expected.keys()
+    for name in expected:
+        assert_same_result(SimpleNamespace(**actual[name]), SimpleNamespace(**expected[name]))
+
+def random_close(n, seed):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+
+CONFIG = {'initialCapital': 100000.0, 'investmentPerTrade': 10000.0, 'maxLookback': 60}
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_resumed_matches_full_run(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(700, 2000))
+    split = int(rng.integers(20, n - 1))
+    close = random_close(n, seed)
+    config = dict(CONFIG, stopLoss=0.05, trailingStop=0.08, takeProfit=0.2) if seed % 2 else CONFIG
+
+    _, _, checkpoint = run(crossover, close[:split], config)
+    resumed_results, resumed, resumed_checkpoint = run(crossover, close, config, checkpoint)
+    full_results, _, full_checkpoint = run(crossover, close, config)
+
+    assert resumed
+    assert_same_results(resumed_results, full_results)
+    assert np.array_equal(resumed_checkpoint.signals, full_checkpoint.signals)
+    for name, state in full_checkpoint.states.items():
+        assert np.allclose(resumed_checkpoint.states[name].equity, state.equity)
+
+def test_unbounded_lookback_runs_in_full():
+    # falls for longer than the signal tail, then recovers past the old high
+    close = np.concatenate([np.linspace(100, 40, 900), np.linspace(40, 120, 600)])
+    close *= 1 + 0.01 * np.sin(np.arange(len(close)))
+    config = {'initialCapital': 1e7, 'investmentPerTrade': 10000.0}
+
+    _, _, checkpoint = run(new_high, close[:1000], config)
+    assert checkpoint is None
+    results, resumed, _ = run(new_high, close, config)
+    assert not resumed
+
+    # a checkpoint from a run with a declared lookback is not picked up without one
+    _, _, declared = run(new_high, close[:1000], dict(config, maxLookback=60))
+    results_with_stale, resumed, _ = run(new_high, close, config, declared)
+    assert not resumed
+    assert_same_results(results_with_stale, results)
+
+@pytest.mark.parametrize("change", ["settings", "data", "shorter"])
+def test_falls_back_to_full_run(change):
+    close = random_close(1500, 3)
+    _, _, checkpoint = run(crossover, close[:1200], CONFIG)
+    config = CONFIG
+    if change == "settings":
+        config = dict(CONFIG, investmentPerTrade=20000.0)
+    elif change == "data":
+        close = close.copy()
+        close[10] *= 1.01
+    else:
+        close = close[:1000]
+
+    results, resumed, _ = run(crossover, close, config, checkpoint)
+    assert not resumed
+    assert_same_results(results, run(crossover, close, config)[0])
+
+@pytest.mark.parametrize("lookback", [None, 0, -5, 2.5, True, "60", float("nan"), float("inf")])
+def test_declared_lookback(lookback):
+    assert execute.declared_lookback({'maxLookback': lookback}) is None
+    assert execute.declared_lookback({'maxLookback': 60}) == 60
+    assert execute.declared_lookback({'maxLookback': 60.0}) == 60
+
+def test_resumes_with_config_from_file(tmp_path):
+    # written the way the worker writes params, read back the way a job does
+    path = tmp_path / "config.txt"
+    path.write_text("".join(f"{key}={value}\n" for key, value in CONFIG.items()))
+    config = execute.read_config(str(path))
+    assert config['maxLookback'] == 60.0
+
+    close = random_close(1500, 4)
+    _, _, checkpoint = run(crossover, close[:1200], config)
+    results, resumed, _ = run(crossover, close, config, checkpoint)
+    assert resumed
+    assert_same_results(results, run(crossover, close, config)[0])
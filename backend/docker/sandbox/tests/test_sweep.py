@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+import execute
+import strategy
+from strategy import ExitRules
+from test_engine import assert_same_value, price_frame
+
+CONFIG = {'initialCapital': 100000.0, 'investmentPerTrade': 10000.0}
+
+
+def crossover(data, params):
+    fast = data['close'].rolling(params['fast']).mean()
+    slow = data['close'].rolling(params['slow']).mean()
+    data['signal'] = np.where(fast > slow, 1, np.where(fast < slow, -1, 0))
+
+Crossover = type("Strategy", (strategy.BaseStrategy,), {"generate_signals": crossover})
+
+
+def test_expand_grid():
+    assert execute.expand_grid(None) == []
+    assert execute.expand_grid([{"a": 1}, {"a": 1}]) == [{"a": 1}, {"a": 1}]
+    assert execute.expand_grid({"a": [1, 2], "b": 3}) == [{"a": 1, "b": 3}, {"a": 2, "b": 3}]
+
+def test_distinct_signal_sets():
+    assert execute.distinct_signal_sets([{"a": 1, "b": 2}, {"b": 2, "a": 1}, {"a": 3}], True) == [{"a": 1, "b": 2}, {"a": 3}]
+    assert execute.distinct_signal_sets(None, True) == [{}]
+    assert execute.distinct_signal_sets(None, False) == [None]
+    with pytest.raises(ValueError):
+        execute.distinct_signal_sets({"a": [1]}, False)
+
+@pytest.mark.parametrize("seed", range(3))
+def test_rows_match_single_runs(seed):
+    df = price_frame(800, seed)
+    sweep = {
+        "signal_params": {"fast": [3, 8], "slow": [20, 50]},
+        "engine": {"tradingMethod": [0, 1], "stopLoss": [None, 0.05], "investmentPerTrade": [5000.0, 10000.0]},
+    }
+    table = execute.run_sweep(Crossover, df, CONFIG, sweep, True)
+    grid = [(params, engine) for params in execute.expand_grid(sweep["signal_params"])
+            for engine in execute.expand_grid(sweep["engine"])]
+    assert len(table["rows"]) == len(grid) == 32
+
+    # rows come in grid order, signal sets outermost
+    for row, (params, engine) in zip(table["rows"], grid):
+        row = dict(zip(table["columns"], row))
+        assert (row["fast"], row["slow"]) == (params["fast"], params["slow"])
+        assert (row["tradingMethod"], row["investmentPerTrade"]) == (engine["tradingMethod"], engine["investmentPerTrade"])
+
+        config = {**CONFIG, **engine}
+        expected = Crossover(
+            df.copy(), initial_capital=config['initialCapital'], investment_per_trade=config['investmentPerTrade'],
+            trading_method=config['tradingMethod'], params=params, exit_rules=ExitRules.from_config(config),
+        ).run_backtest()
+        for key in execute.SWEEP_METRICS:
+            assert_same_value(row[key], getattr(expected, key), key)
+
+def test_signals_generated_once_per_distinct_set():
+    calls = []
+
+    def counted(data, params):
+        calls.append(dict(params))
+        crossover(data, params)
+
+    cls = type("Strategy", (strategy.BaseStrategy,), {"generate_signals": counted})
+    sweep = {"signal_params": [{"fast": 3, "slow": 20}, {"slow": 20, "fast": 3}], "engine": {"tradingMethod": [0, 1]}}
+    table = execute.run_sweep(cls, price_frame(300, 1), CONFIG, sweep, True)
+    assert calls == [{"fast": 3, "slow": 20}]
+    assert len(table["rows"]) == 2
+
+def test_too_many_configurations():
+    sweep = {"signal_params": {"fast": list(range(1, 51))}, "engine": {"tradingMethod": [0, 1], "stopLoss": [None, 0.1, 0.2, 0.3, 0.4, 0.5]}}
+    with pytest.raises(ValueError, match="configurations"):
+        execute.run_sweep(Crossover, price_frame(100, 0), CONFIG, sweep, True)
@@ -0,0 +1,51 @@
+import pytest
+from validation import validate_user_code
+
+ATR_BANDS = '''
+def generate_signals(data):
+    high_low = data["high"] - data["low"]
+    high_close = abs(data["high"] - data["close"].shift(1))
+    low_close = abs(data["low"] - data["close"].shift(1))
+    true_range = high_low.to_frame().join(high_close.to_frame()).join(low_close.to_frame()).max(axis=1)
+    data["atr"] = true_range.rolling(window=14, min_periods=1).mean()
+    data["middle_line"] = data["close"].ewm(span=20, adjust=False).mean()
+    data["signal"] = 0
+    data.loc[data["close"] > data["middle_line"] + 2 * data["atr"], "signal"] = 1
+    data.loc[data["close"] < data["middle_line"] - 2 * data["atr"], "signal"] = -1
+'''
+
+WITH_PARAMS = '''
+def generate_signals(data, params):
+    fast = data["close"].rolling(params["fast"]).mean()
+    data["signal"] = np.where(fast > data["close"], 1, -1)
+    data["z"] = (data["close"] - data["close"].mean()) / data["close"].std()
+'''
+
+
+@pytest.mark.parametrize("code", [ATR_BANDS, WITH_PARAMS])
+def test_accepts_strategies(code):
+    validate_user_code(code)
+
+@pytest.mark.parametrize("code", [
+    "import os",
+    "from os import system",
+    "exec('1')",
+    "__import__('os')",
+    "getattr(pd, 'io')",
+    "os.system('id')",
+    "pd.io.common.os.system('id')",
+    "np.lib.npyio.os.popen('id')",
+    "pd.compat.subprocess",
+    "pd.read_pickle('/tmp/x')",
+    "().__class__.__bases__[0].__subclasses__()",
+    "data._mgr",
+    "__builtins__",
+    "f = (lambda: 0).__globals__",
+])
+def test_rejects(code):
+    with pytest.raises(ValueError):
+        validate_user_code(code)
+
+def test_syntax_error():
+    with pytest.raises(SyntaxError):
+        validate_user_code("def generate_signals(data)")
@@ -0,0 +1,54 @@
+import pytest
+import execute
+import strategy
+from test_engine import assert_same_value, price_frame, replay
+from test_sweep import CONFIG, Crossover
+
+Replay = type("Strategy", (strategy.BaseStrategy,), {"generate_signals": replay})
+
+PARAMS = [{"fast": 3, "slow": 20}, {"fast": 5, "slow": 40}, {"fast": 10, "slow": 30}]
+
+
+def window_result(df, signals, start, stop, config):
+    # signals come from the whole range, so the window starts warmed up
+    window = df.iloc[start:stop].assign(sig=signals[start:stop]).reset_index(drop=True)
+    return Replay(window, initial_capital=config['initialCapital'], investment_per_trade=config['investmentPerTrade'],
+                  exit_rules=strategy.ExitRules.from_config(config)).run_backtest()
+
+@pytest.mark.parametrize("objective", ["sharpeRatio", "totalReturn", "profitFactor"])
+@pytest.mark.parametrize("seed", range(2))
+def test_matches_brute_force(seed, objective):
+    df = price_frame(700, seed)
+    config = dict(CONFIG, trailingStop=0.1) if seed else CONFIG
+    spec = {"train_bars": 200, "test_bars": 100, "step_bars": 80, "signal_params": PARAMS, "objective": objective}
+    table = execute.run_walk_forward(Crossover, df, config, spec, True)
+
+    signals = [Crossover(df.copy(), params=params).compute_signals() for params in PARAMS]
+    starts = range(0, len(df) - 300 + 1, 80)
+    assert len(table["rows"]) == len(starts) == 6
+
+    for row, start in zip(table["rows"], starts):
+        row = dict(zip(table["columns"], row))
+        split, stop = start + 200, start + 300
+        assert [row["trainFrom"], row["trainTo"], row["testFrom"], row["testTo"]] == \
+            df['Date'].iloc[[start, split - 1, split, stop - 1]].tolist()
+
+        scores = [execute.objective_value(getattr(window_result(df, candidate, start, split, config), objective))
+                  for candidate in signals]
+        best = scores.index(max(scores))
+        assert (row["fast"], row["slow"]) == (PARAMS[best]["fast"], PARAMS[best]["slow"])
+        assert_same_value(row[f"inSample_{objective}"], scores[best], objective)
+
+        expected = window_result(df, signals[best], split, stop, config)
+        for key in execute.SWEEP_METRICS:
+            assert_same_value(row[key], getattr(expected, key), key)
+
+@pytest.mark.parametrize("spec, message", [
+    ({"train_bars": 150, "test_bars": 60}, "too short"),
+    ({"train_bars": 10, "test_bars": 5, "step_bars": 1}, "windows"),
+    ({"train_bars": 1, "test_bars": 5}, "at least 2 bars"),
+    ({"train_bars": 20, "test_bars": 5, "objective": "luck"}, "objective"),
+])
+def test_rejects_bad_spec(spec, message):
+    with pytest.raises(ValueError, match=message):
+        execute.run_walk_forward(Crossover, price_frame(200, 0), CONFIG, dict(spec, signal_params=PARAMS), True)
@@ -0,0 +1,64 @@
+import time
+import resource
+from contextlib import contextmanager
+from functools import wraps
+
+
+class PhaseTimer:
+    """Wall and CPU time per named phase. Phases nest; a phase only counts
+    its own time, so what a nested phase spends is not booked twice."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Start a new job; the warm runner forks children long after import."""
+        self.started = (time.perf_counter(), time.process_time())
+        self.phases = {}
+        self._stack = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start = (time.perf_counter(), time.process_time())
+        # [wall, cpu] spent in phases nested under this one
+        nested = [0.0, 0.0]
+        self._stack.append(nested)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            wall = time.perf_counter() - start[0]
+            cpu = time.process_time() - start[1]
+            entry = self.phases.setdefault(name, [0.0, 0.0])
+            entry[0] += wall - nested[0]
+            entry[1] += cpu - nested[1]
+            if self._stack:
+                self._stack[-1][0] += wall
+                self._stack[-1][1] += cpu
+
+    def report(self) -> dict:
+        return {
+            "phases": {
+                name: {"wall_ms": wall * 1000, "cpu_ms": cpu * 1000}
+                for name, (wall, cpu) in self.phases.items()
+            },
+            "total": {
+                "wall_ms": (time.perf_counter() - self.started[0]) * 1000,
+                "cpu_ms": (time.process_time() - self.started[1]) * 1000,
+            },
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+
+
+timer = PhaseTimer()
+
+
+def timed(name: str):
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer.phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,46 @@
+"""Static checks on user strategy code.
+
+The one copy: the sandbox imports it from here, and the web app loads this
+same file (apps/engine/validation.py), so both reject exactly the same code.
+"""
+import ast
+
+BLOCKED_CALLS = {
+    "exec", "eval", "compile", "open", "input", "breakpoint", "__import__",
+    "getattr", "setattr", "delattr", "globals", "locals", "vars", "dir",
+}
+
+# modules pandas and numpy re-export (pd.io.common.os, np.lib.npyio.os, ...)
+# and the attributes that reach a shell, a file loader or a frame's globals
+BLOCKED_NAMES = {
+    "os", "sys", "subprocess", "shutil", "socket", "pathlib", "importlib", "builtins",
+    "io", "ctypes", "ctypeslib", "pickle", "marshal", "f2py", "distutils", "inspect", "gc",
+    "system", "popen", "spawn", "fork", "execv", "execve", "execvp", "read_pickle", "to_pickle",
+    "f_globals", "f_locals", "f_builtins", "f_back", "gi_frame", "cr_frame", "ag_frame", "tb_frame",
+}
+
+
+class SafeCodeVisitor(ast.NodeVisitor):
+    def visit_Import(self, node):
+        raise ValueError("Import statements are not allowed")
+    def visit_ImportFrom(self, node):
+        raise ValueError("Import statements are not allowed")
+    def visit_Call(self, node):
+        if isinstance(node.func, ast.Name) and node.func.id in BLOCKED_CALLS:
+            raise ValueError(f"Call to '{node.func.id}' is not allowed")
+        self.generic_visit(node)
+    def visit_Name(self, node):
+        if node.id in BLOCKED_NAMES or node.id.startswith("__"):
+            raise ValueError(f"Use of '{node.id}' is not allowed")
+    def visit_Attribute(self, node):
+        # any private attribute walks out of the library's API: __class__, _private, ...
+        if node.attr in BLOCKED_NAMES or node.attr.startswith("_"):
+            raise ValueError(f"Access to '.{node.attr}' is not allowed")
+        self.generic_visit(node)
+
+
+def validate_user_code(code):
+    """Raises SyntaxError or ValueError for code the sandbox won't run."""
+    tree = ast.parse(code)
+    SafeCodeVisitor().visit(tree)
+    return tree
@@ -0,0 +1,12 @@
+#!/bin/sh
+set -Eeuo pipefail
+APP_HOME=${APP_HOME:-/home/steakystick/backdrop/backend}
+cd "$APP_HOME"
+
+set -a
+[ -f .env ] && . ./.env
+set +a
+
+# the only scheduler: a second beat would fire every job twice
+exec "$APP_HOME/venv/bin/celery" -A config beat \
+  --loglevel=info --schedule "$APP_HOME/celerybeat-schedule"
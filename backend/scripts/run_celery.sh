@@ -7,5 +7,12 @@ set -a
 [ -f .env ] && . ./.env
 set +a
 
+if [ "${EXECUTION_MODE:-prefork}" = "async" ]; then
+  # one process, task threads driving a shared event loop, one per pooled container
+  POOL_ARGS="--pool=threads --concurrency=${CONTAINER_POOL_SIZE:-2}"
+else
+  POOL_ARGS="--concurrency=2"
+fi
+
 exec "$APP_HOME/venv/bin/celery" -A config worker \
-  --loglevel=info --concurrency=2 -Q execution_queue
+  --loglevel=info $POOL_ARGS -Q execution_queue
@@ -0,0 +1,12 @@
+#!/bin/sh
+set -Eeuo pipefail
+APP_HOME=${APP_HOME:-/home/steakystick/backdrop/backend}
+cd "$APP_HOME"
+
+set -a
+[ -f .env ] && . ./.env
+set +a
+
+# warm/refresh only: keeps them off the execution workers' slots
+exec "$APP_HOME/venv/bin/celery" -A config worker \
+  --loglevel=info --concurrency=1 -Q maintenance_queue -n maintenance@%h
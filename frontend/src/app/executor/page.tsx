@@ -170,11 +170,11 @@ export default function Executor() {
   useEffect(() => {
     if (result) {
       try {
-        const resultData = JSON.parse(result.stdout);
-        if (result.exit_code !== 0 || resultData.error) {
+        const resultData = result.result;
+        if (result.exit_code !== 0 || !resultData || resultData.error) {
           setExecutionError({
-            error: resultData.error,
-            warnings: resultData.warnings,
+            error: resultData?.error,
+            warnings: resultData?.warnings,
             stderr: result.stderr,
             exit_code: result.exit_code
           });
@@ -2,14 +2,14 @@ import { formatters } from "@/utils/formatters";
 
 interface RatioCardProps {
   title: string;
-  value: number | string;
+  value: number | string | null;
   description?: string;
 }
 
 export const RatioCard = ({ title, value, description }: RatioCardProps) => (
   <div className="metric-card group relative">
     <div className="text-sm text-muted-foreground">{title}</div>
-    <div className="text-xl font-semibold">{typeof value === "number" ? formatters.decimal.format(value) : value}</div>
+    <div className="text-xl font-semibold">{typeof value === "number" ? formatters.decimal.format(value) : value ?? "N/A"}</div>
     {description && (
       <div className="ratio-tooltip">
         {description}
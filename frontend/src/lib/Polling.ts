@@ -1,20 +1,22 @@
 import { useState, useMemo } from "react";
 import { BACKEND_URL } from "@/lib/config";
 
-interface ExecutionResult {
-  exit_code: number;
-  stdout: string;
-  stderr: string;
-}
-
 interface ParsedResponse {
   error?: string;
   warnings?: string[] | null;
   results?: {
     loss_cutting?: any;
+    risk_reduction?: any;
   };
 }
 
+interface ExecutionResult {
+  exit_code: number;
+  result: ParsedResponse | null;
+  stdout: string;
+  stderr: string;
+}
+
  
 
 const useCodeExecution = () => {
@@ -23,10 +25,10 @@ const useCodeExecution = () => {
   const [error, setError] = useState<string | null>(null);
 
   const parsedResult = useMemo(() => {
-    if (!result?.stdout) return null;
+    if (!result?.result) return null;
 
     try {
-      const parsed: ParsedResponse = JSON.parse(result.stdout);
+      const parsed = result.result;
 
       if (parsed.error || result.exit_code !== 0) {
         return null;
@@ -79,7 +81,9 @@ const useCodeExecution = () => {
       });
 
       if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
+        // rejected code comes back as a 400 with the reason in `error`
+        const body = await response.json().catch(() => null);
+        throw new Error(body?.error || `HTTP error! status: ${response.status}`);
       }
 
       const { task_id, status_url } = await response.json();
@@ -96,10 +100,11 @@ const useCodeExecution = () => {
     setError(err.message || "An unknown error occurred");
     setResult({
       exit_code: 1,
-      stdout: JSON.stringify({ 
+      result: {
         error: err.message,
-        warnings: null 
-      }),
+        warnings: null
+      },
+      stdout: "",
       stderr: err.stack || "No stack trace available"
     });
   };
@@ -20,6 +20,29 @@ export type Trade = {
   exitReason: string;
 };
 
+export type TradeColumns = {
+  entry_date: string[];
+  exit_date: (string | null)[];
+  entry_price: number[];
+  exit_price: (number | null)[];
+  quantity: number[];
+  pnl: number[];
+  exit_reason: string[];
+  symbol?: string[];
+};
+
+export const tradeRows = (columns: TradeColumns): Trade[] =>
+  columns.entry_date.map((entryDate, i) => ({
+    entryDate,
+    exitDate: columns.exit_date[i] ?? "",
+    entryPrice: columns.entry_price[i],
+    exitPrice: columns.exit_price[i] ?? 0,
+    quantity: columns.quantity[i],
+    side: "LONG",
+    pnl: columns.pnl[i],
+    exitReason: columns.exit_reason[i],
+  }));
+
 type CurvePoint = {
   date: string;
   value: number;
@@ -31,10 +54,11 @@ export type StrategyResult = {
   finalCapital: number;
   equityCurve: CurvePoint[];
   drawdownCurve: CurvePoint[];
-  trades: Trade[];
+  trades: TradeColumns;
   totalReturn: number; 
   totalReturnPct: number; 
-  sharpeRatio: number; 
+  // null where the metric is undefined, e.g. a run without trades
+  sharpeRatio: number | null; 
   maxDrawdown: number; 
   maxDrawdownPct: number; 
   winRate: number; 
@@ -45,7 +69,7 @@ export type StrategyResult = {
   avgLoserPnl: number | string ;
   annualizedVolatility: number;
   calmarRatio: number | string;
-  sortinoRatio: number | string ;
+  sortinoRatio: number | string | null;
 };
 
 export type Template = {